@@ -0,0 +1,215 @@
+"""抽奖热点路径基准测试：无界面运行（Tk替换为空实现），按奖品种类数扫描各版本的性能
+
+    python bench_draw.py                                # 默认对比 draw2.0.2 / draw2.2.4 / draw2.3.0
+    python bench_draw.py draw2.2.4.py --sizes 10 1000 --output bench_output.txt
+
+每行输出一条JSON记录，便于不同版本、不同机器之间对比。
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+DEFAULT_TARGETS = ["draw2.0.2.py", "draw2.2.4.py", "draw2.3.0.py"]
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+
+
+# ================= 空Tk实现 =================
+class NullWidget:
+    """接受任意参数、任意方法调用的空控件，方法一律返回0"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _null_call
+
+
+def _null_call(*args, **kwargs):
+    return 0
+
+
+def install_null_tk():
+    """把tkinter及其子模块替换为空实现，必须在加载被测版本之前调用"""
+    modules = {}
+    for name in ("tkinter", "tkinter.ttk", "tkinter.messagebox", "tkinter.simpledialog", "tkinter.filedialog",
+                 "tkinter.font"):
+        module = types.ModuleType(name)
+        module.__getattr__ = lambda attr: NullWidget
+        modules[name] = module
+    tk = modules["tkinter"]
+    for sub in ("ttk", "messagebox", "simpledialog", "filedialog", "font"):
+        setattr(tk, sub, modules["tkinter." + sub])
+    tk.END = "end"
+    sys.modules.update(modules)
+
+
+def load_target(path):
+    name = "bench_" + os.path.basename(path).replace(".", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ================= 测试数据 =================
+def write_catalogue(directory, size, seed):
+    rng = random.Random(seed)
+    path = os.path.join(directory, "prizes.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,quantity\n")
+        for i in range(size):
+            f.write(f"奖品{i:07d},{rng.randint(1, 100)}\n")
+    return path
+
+
+def catalogue_rows(path):
+    with open(path, encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            name, quantity = line.rstrip("\n").split(",")
+            yield name, int(quantity)
+
+
+# ================= 计时 =================
+def measure(op, max_ops, budget):
+    """重复执行op直到次数或时间用完，返回延迟统计"""
+    latencies = []
+    gc.collect()
+    start = time.perf_counter()
+    deadline = start + budget
+    clock = time.perf_counter_ns
+    while len(latencies) < max_ops:
+        t0 = clock()
+        op()
+        latencies.append(clock() - t0)
+        if time.perf_counter() > deadline:
+            break
+    elapsed = sum(latencies) / 1e9
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] / 1000
+
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / elapsed if elapsed else None,
+        "p50_us": pct(50),
+        "p90_us": pct(90),
+        "p99_us": pct(99),
+        "max_us": latencies[-1] / 1000,
+    }
+
+
+def prize_count(app):
+    return len(app.prizes)
+
+
+def wait_loaded(app):
+    """后台加载的版本：空Tk不会调度after，这里手动排空加载队列直到完成"""
+    while getattr(app, "loading", False):
+        app._drain_load_queue()
+        time.sleep(0.001)
+
+
+def bench_target(target, size, directory, args):
+    """对一个版本、一种规模跑全部测试，逐条产出结果"""
+    module = load_target(target)
+    catalogue = os.path.join(directory, "prizes.csv")
+    base = {"target": os.path.basename(target), "size": size}
+
+    # 启动（含load_prizes）：单独一轮用tracemalloc记峰值内存
+    random.seed(args.seed)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    app = module.LotteryApp(NullWidget())
+    wait_loaded(app)
+    startup = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    injected = False
+    if prize_count(app) == 0 and isinstance(app.prizes, list):
+        # 早期版本的load_prizes不会真正读入数据，这里直接注入同一份奖品表
+        app.prizes = [{"name": n, "quantity": q} for n, q in catalogue_rows(catalogue)]
+        injected = True
+    yield dict(base, op="startup", seconds=startup, peak_mem_bytes=peak, prizes=prize_count(app),
+               catalogue_injected=injected)
+
+    if hasattr(app, "engine"):
+        app.engine.rng.seed(args.seed)
+    yield dict(base, op="load_prizes", **measure(app.load_prizes, args.max_ops, args.budget))
+    if injected:
+        app.prizes = [{"name": n, "quantity": q} for n, q in catalogue_rows(catalogue)]
+
+    yield dict(base, op="update_listbox", **measure(app.update_listbox, args.max_ops, args.budget))
+
+    def roll_tick():
+        app.is_rolling = True
+        app.last_update = 0
+        app.roll()
+    yield dict(base, op="roll_tick", **measure(roll_tick, args.max_ops, args.budget))
+    app.is_rolling = False
+
+    if hasattr(app, "engine"):
+        remaining = app.engine.remaining
+        draw = app.engine.draw
+    else:
+        remaining = sum(p["quantity"] for p in app.prizes)
+        prizes = app.prizes
+        weighted_random = module.LotteryAlgorithm.weighted_random
+
+        def draw():
+            weighted_random(prizes)
+    # 引擎的draw和stop_roll都会扣减库存，次数控制在剩余件数以内，避免测到"已抽完"分支
+    yield dict(base, op="draw", **measure(draw, min(args.max_ops, remaining // 2), args.budget))
+    yield dict(base, op="stop_roll", **measure(app.stop_roll, min(args.max_ops, remaining // 2), args.budget))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽奖热点路径基准测试")
+    parser.add_argument("targets", nargs="*", help=f"被测版本文件，默认{' '.join(DEFAULT_TARGETS)}")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="奖品种类数")
+    parser.add_argument("--max-ops", type=int, default=2000, help="每项最多执行次数")
+    parser.add_argument("--budget", type=float, default=2.0, help="每项最长耗时（秒）")
+    parser.add_argument("--seed", type=int, default=20240101)
+    parser.add_argument("--output", help="输出文件，默认标准输出")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    targets = [os.path.abspath(t if os.path.exists(t) else os.path.join(here, t))
+               for t in (args.targets or DEFAULT_TARGETS)]
+    sys.path.insert(0, here)
+    install_null_tk()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    env = {"op": "environment", "python": platform.python_version(), "platform": platform.platform(),
+           "machine": platform.machine(), "seed": args.seed, "max_ops": args.max_ops, "budget": args.budget}
+    out.write(json.dumps(env, ensure_ascii=False) + "\n")
+
+    cwd = os.getcwd()
+    try:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                write_catalogue(directory, size, args.seed)
+                os.chdir(directory)
+                for target in targets:
+                    for record in bench_target(target, size, directory, args):
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+                os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1035 @@
+import tkinter as tk
+import random
+import time
+import sys
+import math
+import os
+import queue
+import argparse
+import threading
+from tkinter import ttk, messagebox, simpledialog, filedialog, font as tkfont
+from draw_engine import DrawEngine, LoadErrors, find_catalogue, read_catalogue
+from draw_export import export_history, open_source, parse_time
+from draw_history import HistoryLog
+from draw_session import SessionLog
+from draw_journal import journal_path_for, open_journal
+from draw_stats import PrizeStats, format_elapsed
+from draw_snapshot import catalogue_sha1, iter_catalogue_batches, open_cached_catalogue
+from draw_store import open_store
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+# ================= 样式配置 =================
+class StyleConfig:
+    FONT_TITLE = ('Microsoft YaHei', 14, 'bold')
+    FONT_TEXT = ('Microsoft YaHei', 11)
+    COLOR_PRIMARY = "#3498db"
+    COLOR_DANGER = "#e74c3c"
+    COLOR_SUCCESS = "#2ecc71"
+    BG_MAIN = "#f0f3f5"
+    BG_CARD = "#ffffff"
+    BORDER_COLOR = "#e0e5ec"
+    BTN_RADIUS = 25
+
+# ================= 动画粒子类 =================
+class Particle:
+    def __init__(self, canvas, x, y):
+        self.canvas = canvas
+        self.radius = random.randint(2, 4)
+        self.life = 1.0
+        self.speed = random.uniform(2, 5)
+        self.angle = math.radians(random.randint(0, 360))
+        self.id = canvas.create_oval(
+            x - self.radius, y - self.radius,
+            x + self.radius, y + self.radius,
+            fill=self.random_color()
+        )
+        
+    def random_color(self):
+        return "#{:02x}{:02x}{:02x}".format(
+            random.randint(200, 255),
+            random.randint(0, 100),
+            random.randint(0, 100)
+        )
+    
+    def update(self):
+        self.life -= 0.02
+        dx = math.cos(self.angle) * self.speed
+        dy = math.sin(self.angle) * self.speed
+        self.canvas.move(self.id, dx, dy)
+        self.canvas.itemconfig(self.id, opacity=self.life)
+        return self.life > 0
+
+# ================= 增强版圆角按钮 =================
+class RoundedButton(tk.Canvas):
+    def __init__(self, master=None, text="", command=None, width=100, height=40, **kwargs):
+        super().__init__(master, highlightthickness=0, width=width, height=height)
+        self.command = command
+        self.text = text
+        self.bg = kwargs.get('bg', StyleConfig.COLOR_PRIMARY)
+        self.fg = kwargs.get('fg', 'white')
+        self.radius = kwargs.get('radius', StyleConfig.BTN_RADIUS)
+        self.particles = []
+        
+        self.bind("ButtonPress-1>", self._on_press)
+        self.bind("ButtonRelease-1>", self._on_release)
+        self.draw()
+        
+    def draw(self):
+        self.delete("all")
+        width, height = self.winfo_reqwidth(), self.winfo_reqheight()
+        self.create_round_rect(0, 0, width, height, self.radius, fill=self.bg, outline=self.bg)
+        self.create_text(width/2, height/2, text=self.text, fill=self.fg, font=StyleConfig.FONT_TEXT)
+        
+    def create_round_rect(self, x1, y1, x2, y2, r, **kwargs):
+        points = (x1+r, y1, x1+r, y1, x2-r, y1, x2-r, y1, x2, y1,
+                  x2, y1+r, x2, y1+r, x2, y2-r, x2, y2-r, x2, y2,
+                  x2-r, y2, x2-r, y2, x1+r, y2, x1+r, y2, x1, y2,
+                  x1, y2-r, x1, y2-r, x1, y1+r, x1, y1+r, x1, y1)
+        return self.create_polygon(points, **kwargs, smooth=True)
+
+    def _on_press(self, event):
+        self.itemconfig(1, fill=self._adjust_color(self.bg, 0.8))
+        
+    def _on_release(self, event):
+        self.itemconfig(1, fill=self.bg)
+        if self.command: 
+            self.command()
+            
+    def spawn_particles(self, x, y):
+        for _ in range(8):
+            self.particles.append(Particle(self, x, y))
+        self.animate_particles()
+        
+    def animate_particles(self):
+        for p in self.particles.copy():
+            if not p.update():
+                self.delete(p.id)
+                self.particles.remove(p)
+        if self.particles:
+            self.after(30, self.animate_particles)
+        
+    def _adjust_color(self, hex_color, factor):
+        rgb = tuple(int(hex_color[i+1:i+3], 16) for i in (0, 2, 4))
+        return "#{:02x}{:02x}{:02x}".format(*[min(int(c * factor), 255) for c in rgb])
+
+# ================= 虚拟列表 =================
+class VirtualPager:
+    """只渲染可见的一页：控件里始终只有一页的行，滚动时按位置重新取这一页。
+
+    子类提供row_count()和show_page(total)（把从top开始的一页画进控件，返回其中完整可见的行数），
+    并设置row_height（每行像素）和inset（上下边框共占的像素）。滚动条不绑定控件自身的yview，
+    位置与比例按全部行计算，行数再多，每次刷新也只有一页的Tk调用。
+    """
+    header_rows = 0  # 控件顶部不放数据的行数（如Treeview的表头）
+
+    def __init__(self, page_rows):
+        self.top = 0  # 第一个可见行的下标
+        self.page_rows = page_rows  # 完整可见的行数，按控件高度更新
+
+    def bind_scrolling(self, widget):
+        """在widget上绑定滚轮、翻页键和尺寸变化，并拦下控件自带的滚动（里面只有一页的行，不能让它自己滚）"""
+        def bind(sequence, action):
+            def handler(event):
+                action(event)
+                return "break"
+            widget.bind(sequence, handler)
+
+        bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        bind("<Button-4>", lambda e: self.scroll_by(-3))
+        bind("<Button-5>", lambda e: self.scroll_by(3))
+        bind("<Prior>", lambda e: self.scroll_by(-self.page_rows))
+        bind("<Next>", lambda e: self.scroll_by(self.page_rows))
+        bind("<Home>", lambda e: self.scroll_to(0))
+        bind("<End>", lambda e: self.scroll_to(self.row_count()))
+        widget.bind("<Configure>", self._on_resize)
+
+    def _on_resize(self, event):
+        rows = max(1, (event.height - self.inset) // self.row_height - self.header_rows)
+        if rows != self.page_rows:
+            self.page_rows = rows
+            self.refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.row_count()))
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.page_rows)
+        else:
+            self.scroll_by(int(amount))
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.top + rows)
+
+    def scroll_to(self, top):
+        self.top = top
+        self.refresh()
+
+    def refresh(self):
+        """重取可见的这一页（总行数变了也在这里体现）"""
+        total = self.row_count()
+        self.top = max(0, min(self.top, total - self.page_rows))
+        shown = self.show_page(total)
+        if total:
+            self.scrollbar.set(self.top / total, (self.top + shown) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+class VirtualListbox(VirtualPager):
+    """只渲染可见行的Listbox：row_count()返回总行数，row_text(i)返回第i行的文本"""
+    def __init__(self, master, row_count, row_text, **kwargs):
+        super().__init__(20)
+        self.row_count = row_count
+        self.row_text = row_text
+        self.shown = 0
+        self.scrollbar = ttk.Scrollbar(master, command=self._on_scrollbar)
+        self.listbox = tk.Listbox(master, **kwargs)
+        self.row_height, self.inset = self._line_metrics()
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.bind_scrolling(self.listbox)
+
+    def _line_metrics(self):
+        """返回(每行像素高度, 上下边框共占的像素)：Listbox每行是字体行距加1再加上下两圈选中边框"""
+        listbox = self.listbox
+        linespace = tkfont.Font(font=listbox.cget("font")).metrics("linespace")
+        line_height = linespace + 1 + 2 * listbox.winfo_pixels(listbox.cget("selectborderwidth"))
+        inset = 2 * (listbox.winfo_pixels(listbox.cget("borderwidth"))
+                     + listbox.winfo_pixels(listbox.cget("highlightthickness")))
+        return max(1, line_height), inset
+
+    def show_page(self, total):
+        """多取一行填满底部不完整的那一行"""
+        stop = min(total, self.top + self.page_rows + 1)
+        self.listbox.delete(0, tk.END)
+        if stop > self.top:
+            self.listbox.insert(tk.END, *[self.row_text(i) for i in range(self.top, stop)])
+        self.shown = stop - self.top
+        return min(self.shown, self.page_rows)
+
+    def refresh_rows(self, indices):
+        """只重绘指定行中当前可见的那些"""
+        for i in indices:
+            if self.top <= i < self.top + self.shown:
+                self.listbox.delete(i - self.top)
+                self.listbox.insert(i - self.top, self.row_text(i))
+
+# ================= 主程序 =================
+class LotteryApp:
+    WATCH_INTERVAL = 1000  # 热加载轮询间隔（毫秒）
+
+    def __init__(self, master, mode="weighted", seed=None, session_log=None, watch=False, catalogue=None,
+                 journal=None, db=None, history="draw_history.bin"):
+        self.master = master
+        self.mode = mode
+        self.seed = seed
+        self.session_log = session_log
+        self.watch = watch
+        # 奖品表可以是prizes.csv，也可以直接是其gzip/bz2/xz压缩文件
+        self.catalogue = catalogue or find_catalogue("prizes.csv")
+        # 扣减日志：None为不记录，""为默认路径（奖品表旁的.journal文件）
+        self.journal_path = journal_path_for(self.catalogue) if journal == "" else journal
+        # 会话日志和扣减日志都要求从完整的奖品表开始，后台加载完之前不能抽奖
+        self.hold_until_loaded = bool(session_log or self.journal_path)
+        self.db_path = db
+        self.store = None  # 使用SQLite存储时的SqliteStore
+        self.history_path = history
+        self.history = None  # 不用数据库时的中奖历史HistoryLog
+        self.history_window = None
+        self.master.title("抽奖程序 v2.3.0")
+        self.master.geometry("1000x700")
+        self.animation_phase = 0
+        self.roll_job = None  # 新增：动画任务跟踪
+        self._init_ui()
+        self._init_data()
+        
+    def _init_ui(self):
+        self.style = ttk.Style()
+        self.style.configure('TFrame', background=StyleConfig.BG_MAIN)
+        
+        # 主容器
+        main_frame = ttk.Frame(self.master, padding=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 奖品列表卡片
+        list_card = ttk.Frame(main_frame, style='TFrame', relief='solid', borderwidth=2)
+        list_card.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        ttk.Label(list_card, text="奖品库存", font=StyleConfig.FONT_TITLE, background=StyleConfig.BG_CARD).pack(pady=5)
+        
+        # 加载进度（后台加载时显示）
+        self.progress_frame = ttk.Frame(list_card)
+        self.progress = ttk.Progressbar(self.progress_frame, mode='determinate', maximum=100)
+        self.progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.progress_label = ttk.Label(self.progress_frame, text="")
+        self.progress_label.pack(side=tk.LEFT)
+        
+        # 奖品可能有几十万种，列表只渲染可见的一屏
+        self.prize_list = VirtualListbox(list_card, lambda: len(self.prizes), self._row_text,
+                                         font=StyleConfig.FONT_TEXT,
+                                         bg=StyleConfig.BG_CARD,
+                                         highlightthickness=0)
+        self.listbox = self.prize_list.listbox
+        
+        # 动态背景画布
+        self.canvas = tk.Canvas(main_frame, bg=StyleConfig.BG_MAIN, highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        
+        # 结果标签
+        self.result_label = tk.Label(self.canvas, 
+                                   text="点击开始抽奖",
+                                   font=('Microsoft YaHei', 24, 'bold'),
+                                   bg=StyleConfig.BG_MAIN)
+        self.result_label.place(relx=0.5, rely=0.5, anchor='center')
+        
+        # 按钮区
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(pady=20)
+        
+        self.start_btn = RoundedButton(btn_frame, text="开始抽奖", 
+                                      width=200, height=50,
+                                      bg=StyleConfig.COLOR_PRIMARY,
+                                      command=self.toggle_roll)
+        self.start_btn.pack(side=tk.LEFT, padx=10)
+        
+        ttk.Button(btn_frame, text="批量抽奖", command=self.batch_draw).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="中奖记录", command=self.show_history).pack(side=tk.LEFT)
+        
+        # 底部信息
+        ttk.Label(main_frame, text="技术支持: lanyu-cn.cn", cursor="hand2").pack(side=tk.BOTTOM)
+        
+        # 动画初始化
+        self.animate_background()
+
+    def animate_background(self):
+        """背景流光动画"""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        self.canvas.delete("bg_effect")
+        
+        for i in range(0, 360, 15):
+            angle = math.radians(i + self.animation_phase)
+            x1 = width/2 + math.cos(angle) * width
+            y1 = height/2 + math.sin(angle) * height
+            x2 = width/2 - math.cos(angle) * width
+            y2 = height/2 - math.sin(angle) * height
+            self.canvas.create_line(
+                x1, y1, x2, y2,
+                fill=self.hsv_to_hex((i/360, 0.3, 0.95)),
+                width=2,
+                tags="bg_effect",
+                stipple="gray50"
+            )
+            
+        self.animation_phase = (self.animation_phase + 1) % 360
+        self.master.after(50, self.animate_background)
+        
+    def hsv_to_hex(self, hsv):
+        """HSV转十六进制颜色"""
+        h, s, v = hsv
+        c = v * s
+        x = c * (1 - abs((h * 6) % 2 - 1))
+        m = v - c
+        
+        if h<1/6:
+            r, g, b = c, x, 0
+        elif h<2/6:
+            r, g, b = x, c, 0
+        elif h<3/6:
+            r, g, b = 0, c, x
+        elif h<4/6:
+            r, g, b = 0, x, c
+        elif h<5/6:
+            r, g, b = x, 0, c
+        else:
+            r, g, b = c, 0, x
+            
+        return "#{:02x}{:02x}{:02x}".format(
+            int((r + m) * 255),
+            int((g + m) * 255),
+            int((b + m) * 255)
+        )
+
+    def _init_data(self):
+        self.engine = DrawEngine(mode=self.mode, seed=self.seed)
+        self.stats = PrizeStats()
+        self.engine.stats = self.stats
+        self.is_rolling = False
+        self.last_update = 0
+        self.loading = False
+        self.catalogue_sha1 = None  # 扣减日志用的奖品表SHA-1，加载时顺带取得
+        if self.history_path and not self.db_path:
+            # 中奖历史不依赖奖品表：先打开，后台加载期间（乃至加载失败后）抽出的也都记下
+            self._open_history()
+        self.load_prizes()
+
+    def _on_loaded(self):
+        """奖品表全部就绪后再恢复扣减日志、会话日志和热加载"""
+        if self.journal_path:
+            self._open_journal()
+        if self.session_log:
+            self.engine.session = SessionLog.create(self.session_log, self.engine, self.catalogue)
+        if self.watch:
+            self._catalogue_stat = self._stat_catalogue()
+            self._reload_queue = queue.Queue()
+            self._reloading = False
+            self.master.after(self.WATCH_INTERVAL, self._poll_catalogue)
+
+    def _load_from_store(self):
+        """库存与中奖记录都在SQLite里：库存从数据库读出，每次抽奖写回数据库"""
+        try:
+            if self.store is not None:
+                self.store.close()
+            self.store, inventory, errors = open_store(self.db_path, self.catalogue)
+        except FileNotFoundError:
+            messagebox.showerror("错误", f"数据库中还没有奖品，且找不到{self.catalogue}文件")
+            return
+        except Exception as e:
+            messagebox.showerror("加载失败", f"打开数据库失败：{str(e)}")
+            return
+        self.engine.use_inventory(inventory)
+        self.engine.journal = self.store
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        if errors:
+            messagebox.showwarning("数据问题", f"发现{len(errors)}处错误：\n" + "\n".join(errors[:3]))
+        self.update_listbox()
+
+    def _open_journal(self):
+        try:
+            journal, restored, missing = open_journal(self.engine, self.journal_path, self.catalogue_sha1)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("扣减日志", f"无法打开扣减日志：{str(e)}")
+            return
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        if restored:
+            self.update_listbox()
+            messagebox.showinfo("扣减日志", f"已按扣减日志恢复：上次共抽出{restored}件")
+        if missing:
+            messagebox.showwarning("扣减日志", f"扣减日志中有{missing}件在当前奖品表中找不到或已超出库存，已忽略")
+
+    def _open_history(self):
+        try:
+            self.history = HistoryLog(self.history_path)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("中奖记录", f"无法打开中奖记录文件：{str(e)}")
+            return
+        self.engine.history = self.history
+        self.history.warm_index()
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        if self.engine.journal is not None:
+            self.engine.journal.close()
+        if self.history is not None:
+            self.history.close()
+        self.master.destroy()
+
+    @property
+    def prizes(self):
+        return self.engine.inventory
+        
+    def load_prizes(self):
+        if self.db_path:
+            self._load_from_store()
+            return
+        try:
+            cached = open_cached_catalogue(self.catalogue)
+            if cached is None:
+                # 快照失效：后台线程解析，界面边收边显示
+                self._start_background_load(self.catalogue)
+                return
+            inventory, errors = cached
+            if self.journal_path:
+                # 快照刚按mtime和大小验证过，直接取头部记录的SHA-1，不用在主线程读整个CSV
+                self.catalogue_sha1 = catalogue_sha1(self.catalogue)
+            self.engine.use_inventory(inventory)
+            if errors:
+                messagebox.showwarning("数据问题", f"发现{len(errors)}处错误：\n" + "\n".join(errors[:3]))
+            self.update_listbox()
+            self._on_loaded()
+        except FileNotFoundError:
+            messagebox.showerror("错误", f"找不到{self.catalogue}文件")
+        except Exception as e:
+            messagebox.showerror("加载失败", f"加载奖品失败：{str(e)}")
+
+    # ================= 后台加载 =================
+    def _start_background_load(self, path):
+        self.loading = True
+        self.engine.begin_load()
+        self.update_listbox()
+        self.start_btn.config(state='disabled')
+        self.progress.config(value=0)
+        self.progress_label.config(text="正在加载…")
+        self.progress_frame.pack(fill=tk.X, padx=10, pady=(0, 5), before=self.listbox)
+        # 队列有上限：界面来不及消化时解析线程会等待，内存不会堆积
+        self._load_queue = queue.Queue(maxsize=32)
+        threading.Thread(target=self._load_worker, args=(path,), daemon=True).start()
+        self.master.after(30, self._drain_load_queue)
+
+    def _load_worker(self, path):
+        errors = LoadErrors()
+        try:
+            for batch, done, size in iter_catalogue_batches(path, errors):
+                self._load_queue.put(("batch", batch, done, size))
+            # 快照刚重建好时取其头部的SHA-1，否则在这个线程里计算，不占用主线程
+            digest = catalogue_sha1(path) if self.journal_path else None
+            self._load_queue.put(("done", errors, digest))
+        except Exception as e:
+            self._load_queue.put(("error", e))
+
+    def _drain_load_queue(self):
+        """Tk主线程：每次最多处理约30毫秒的数据，保持界面可以重绘和响应"""
+        deadline = time.perf_counter() + 0.03
+        loaded = False
+        while time.perf_counter() < deadline:
+            try:
+                item = self._load_queue.get_nowait()
+            except queue.Empty:
+                break
+            kind = item[0]
+            if kind == "batch":
+                _, batch, done, size = item
+                self.engine.add_rows(batch)
+                loaded = True
+                self.progress.config(value=done * 100 / size if size else 100)
+                self.progress_label.config(text=f"已加载{len(self.prizes)}种奖品")
+                if not self.is_rolling and not self.hold_until_loaded:
+                    # 第一批入库后即可抽奖（记录日志时需等全部加载完，保证日志可回放、可恢复）
+                    self.start_btn.config(state='normal')
+            elif kind == "done":
+                self.update_listbox()
+                self._finish_background_load(item[1], item[2])
+                return
+            else:
+                self.loading = False
+                self.progress_frame.pack_forget()
+                messagebox.showerror("加载失败", f"加载奖品失败：{str(item[1])}")
+                return
+        if loaded:
+            # 可见的一屏可能还没填满，滚动条比例也要更新；整批只刷新一次
+            self.update_listbox()
+        self.master.after(30, self._drain_load_queue)
+
+    def _finish_background_load(self, errors, digest):
+        self.loading = False
+        self.catalogue_sha1 = digest
+        self.progress_frame.pack_forget()
+        if not self.is_rolling:
+            self.start_btn.config(state='normal')
+        if errors:
+            messagebox.showwarning("数据问题", f"发现{len(errors)}处错误：\n" + "\n".join(errors[:3]))
+        self._on_loaded()
+            
+    def update_listbox(self):
+        """重绘列表可见的一屏，与奖品种数无关"""
+        self.prize_list.refresh()
+
+    def _row_text(self, index):
+        if index in self.engine.removed:
+            return f"{self.prizes.name(index)} (已下架)"
+        return f"{self.prizes.name(index)} (剩余：{self.prizes.quantity(index)}件)"
+
+    def refresh_rows(self, indices):
+        """只重绘指定的列表行（不在可见范围内的不用画）"""
+        self.prize_list.refresh_rows(indices)
+
+    # ================= 奖品表热加载 =================
+    def _stat_catalogue(self):
+        try:
+            st = os.stat(self.catalogue)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _poll_catalogue(self):
+        """定时检查奖品表的修改时间和大小，变化时在后台线程解析"""
+        stat = self._stat_catalogue()
+        if stat is not None and stat != self._catalogue_stat and not self._reloading:
+            self._catalogue_stat = stat
+            self._reloading = True
+            threading.Thread(target=self._read_catalogue_worker, daemon=True).start()
+            self.master.after(50, self._apply_reload)
+        self.master.after(self.WATCH_INTERVAL, self._poll_catalogue)
+
+    def _read_catalogue_worker(self):
+        try:
+            rows, errors = read_catalogue(self.catalogue)
+            # 逐行比对也在这个线程里做，主线程只应用有变化的奖品
+            self._reload_queue.put((self.engine.plan_catalogue(rows), errors))
+        except Exception as e:
+            self._reload_queue.put(e)
+
+    def _apply_reload(self):
+        """主线程：取回后台比对好的差异，只更新有变化的行"""
+        try:
+            result = self._reload_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(50, self._apply_reload)
+            return
+        self._reloading = False
+        if isinstance(result, Exception):
+            # 文件可能正在写入，等下次修改时间变化再试
+            return
+
+        plan, errors = result
+        old_count = len(self.prizes)
+        diff = self.engine.apply_plan(plan)
+        if len(self.prizes) != old_count:
+            self.update_listbox()  # 新增的奖品排在末尾，滚动条比例也变了
+        else:
+            self.refresh_rows(diff.changed + diff.removed)
+        if errors:
+            messagebox.showwarning("数据问题", f"发现{len(errors)}处错误：\n" + "\n".join(errors[:3]))
+            
+    def toggle_roll(self):
+        if self.loading and self.hold_until_loaded:
+            messagebox.showinfo("提示", "奖品数据加载中，请稍候")
+            return
+        if not self.prizes:
+            messagebox.showwarning("提示", "请先加载有效奖品数据！")
+            return
+            
+        self.start_roll()
+
+    def start_roll(self):
+        if self.prizes.total <= 0:
+            messagebox.showwarning("提示", "所有奖品已抽完！")
+            return
+        
+        # 禁用按钮并改变状态
+        self.start_btn.config(text="抽奖中...", bg=StyleConfig.COLOR_DANGER, state='disabled')
+        self.is_rolling = True
+        self.last_update = 0
+        self.roll()
+        self.start_label_animation()
+        
+        # 设置1秒后自动停止
+        self.master.after(1000, self.stop_roll)
+
+    def roll(self):
+        if not self.is_rolling:
+            return
+        
+        # 更新奖品显示（每秒20帧）
+        if time.time() - self.last_update > 0.05:
+            prize = self.engine.preview()
+            if prize is not None:
+                self.result_label.config(text=prize)
+                self.last_update = time.time()
+        
+        # 存储任务ID以便取消
+        self.roll_job = self.master.after(20, self.roll)
+
+    def start_label_animation(self):
+        """文字动画效果"""
+        if not self.is_rolling:
+            return
+        
+        # 颜色渐变
+        hue = (time.time() * 0.5) % 1
+        color = self.hsv_to_hex((hue, 0.8, 0.9))
+        
+        # 动态阴影
+        self.result_label.config(
+            fg=color,
+            bg=StyleConfig.BG_MAIN,
+            relief="ridge",
+            borderwidth=2,
+            padx=20,
+            pady=10
+        )
+        
+        # 大小动画
+        size = 24 + int(6 * math.sin(time.time() * 5))
+        self.result_label.config(font=('Microsoft YaHei', size, 'bold'))
+        
+        self.master.after(50, self.start_label_animation)
+        
+    def stop_roll(self):
+        # 停止动画循环
+        self.is_rolling = False
+        if self.roll_job:
+            self.master.after_cancel(self.roll_job)
+        
+        if winsound: 
+            try:
+                winsound.MessageBeep()
+            except Exception:
+                pass
+        
+        selected = self.engine.draw()
+        if selected is not None:
+            self.update_listbox()
+            self.refresh_history()
+            self.show_final_animation(selected)
+        else:
+            self.result_label.config(
+                text="所有奖品已抽完！",
+                fg=StyleConfig.COLOR_DANGER,
+                font=('Microsoft YaHei', 24, 'bold')
+            )
+            
+        # 恢复按钮状态
+        self.start_btn.config(text="开始抽奖", bg=StyleConfig.COLOR_PRIMARY, state='normal')
+        
+    def batch_draw(self):
+        """一次抽出多名中奖者，库存和列表只刷新一次"""
+        if self.is_rolling or (self.loading and self.hold_until_loaded):
+            return
+        if self.prizes.total <= 0:
+            messagebox.showwarning("提示", "所有奖品已抽完！")
+            return
+        k = simpledialog.askinteger("批量抽奖", f"抽取数量（剩余{self.prizes.total}件）：",
+                                    parent=self.master, minvalue=1, maxvalue=self.prizes.total)
+        if not k:
+            return
+
+        winners, counts = self.engine.draw_many(k)
+        self.update_listbox()
+        self.refresh_history()
+        self.show_final_animation(f"{len(winners)}件奖品")
+
+        summary = [f"{self.prizes.name(i)} × {c}" for i, c in counts.most_common(20)]
+        if len(counts) > 20:
+            summary.append(f"……共{len(counts)}种奖品")
+        messagebox.showinfo("批量抽奖结果", "\n".join(summary))
+
+    def show_final_animation(self, prize_name):
+        """中奖最终动画"""
+        self.result_label.config(
+            text=f"恭喜获得：{prize_name}",
+            fg=StyleConfig.COLOR_SUCCESS,
+            font=('Microsoft YaHei', 32, 'bold')
+        )
+        
+        # 粒子爆发效果
+        x, y = self.result_label.winfo_x()+self.result_label.winfo_width()/2, \
+               self.result_label.winfo_y()+self.result_label.winfo_height()/2
+        
+        for _ in range(50):
+            Particle(self.canvas, x, y)
+            
+    def show_history(self):
+        source = self.store if self.store is not None else self.history
+        if source is None:
+            messagebox.showinfo("中奖记录", "没有可用的中奖记录")
+            return
+        if self.history_window is not None and self.history_window.exists():
+            self.history_window.win.lift()
+            return
+        self.history_window = HistoryWindow(self.master, source, self._open_history_reader, self.stats)
+
+    def _open_history_reader(self):
+        """给后台线程（导出等）单独打开一个只读的记录源，不与界面共用连接"""
+        if self.store is not None:
+            return open_source(db=self.db_path)
+        return open_source(history=self.history_path)
+
+    def refresh_history(self):
+        """抽奖后刷新已打开的中奖记录窗口"""
+        if self.history_window is not None and self.history_window.exists():
+            self.history_window.refresh()
+
+
+class SearchResults:
+    """搜索结果，提供与记录源相同的len()和read_recent()，供HistoryWindow分页显示"""
+    def __init__(self, prefix, total, rows, elapsed):
+        self.prefix = prefix
+        self.total = total
+        self.rows = rows  # 新的在前
+        self.elapsed = elapsed
+
+    def __len__(self):
+        return len(self.rows)
+
+    def read_recent(self, offset, limit):
+        return self.rows[offset:offset + limit]
+
+    def describe(self, top, shown):
+        text = f"“{self.prefix}”" if self.prefix else "该时间段"
+        if not self.total:
+            return f"{text}：没有匹配的记录（{self.elapsed * 1000:.0f}毫秒）"
+        more = f"，显示最新的{len(self.rows)}条" if self.total > len(self.rows) else ""
+        return (f"{text}：找到{self.total}条{more}，当前第{top + 1}-{top + shown}条"
+                f"（{self.elapsed * 1000:.0f}毫秒，点“全部”返回）")
+
+
+class HistoryWindow(VirtualPager):
+    """中奖记录窗口：Treeview里只放当前可见的一页，滚动时按位置从记录中取这一页。
+
+    source需提供len()、read_recent(offset, limit)（新的在前）和search()，HistoryLog和SqliteStore都满足；
+    open_reader()为后台线程打开一个独立的只读记录源；stats为PrizeStats时在上方显示实时统计。
+    """
+    STATS_INTERVAL = 1000  # 统计面板刷新间隔（毫秒），"距上次抽中"随时间变化
+    STATS_ROWS = 5
+    header_rows = 1
+    inset = 0
+
+    def __init__(self, master, source, open_reader=None, stats=None):
+        self.source = source
+        self.view = source  # 当前显示的记录：全部记录，或搜索结果SearchResults
+        self.open_reader = open_reader
+        self.stats = stats
+        self.export_job = None
+        super().__init__(25)  # top为当前页第一行距最新一条的偏移
+        self.win = tk.Toplevel(master)
+        self.win.title("中奖记录")
+        self.win.geometry("560x600")
+        if open_reader is not None:
+            menubar = tk.Menu(self.win)
+            file_menu = tk.Menu(menubar, tearoff=0)
+            file_menu.add_command(label="导出…", command=self.ask_export)
+            menubar.add_cascade(label="文件", menu=file_menu)
+            self.win.config(menu=menubar)
+        if stats is not None:
+            self._init_stats_panel()
+        self._init_search_bar()
+
+        frame = ttk.Frame(self.win)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 0))
+        self.tree = ttk.Treeview(frame, columns=("seq", "time", "prize"), show="headings",
+                                 height=self.page_rows, selectmode="browse")
+        self.tree.heading("seq", text="序号")
+        self.tree.heading("time", text="时间")
+        self.tree.heading("prize", text="奖品")
+        self.tree.column("seq", width=90, anchor=tk.E, stretch=False)
+        self.tree.column("time", width=160, stretch=False)
+        self.row_height = self._row_height()
+        # 滚动条不绑定Treeview自身的yview：位置与比例都按全部记录计算
+        self.scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.status = ttk.Label(self.win, text="")
+        self.status.pack(fill=tk.X, padx=10, pady=5)
+
+        # 翻页键只绑在Treeview上：绑到窗口会让搜索框里的Home/End在移动光标的同时也滚动列表
+        self.bind_scrolling(self.tree)
+        self.refresh()
+        if stats is not None:
+            self.refresh_stats()
+
+    def _row_height(self):
+        """Treeview的行高（像素）：主题设置了rowheight就用它，否则与Treeview一样按默认字体的行距"""
+        height = ttk.Style(self.win).lookup("Treeview", "rowheight")
+        if not height:
+            height = tkfont.nametofont("TkDefaultFont").metrics("linespace")
+        return max(1, int(height))
+
+    def _init_stats_panel(self):
+        panel = ttk.LabelFrame(self.win, text="实时统计（本次启动以来）")
+        panel.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.stats_label = ttk.Label(panel, text="")
+        self.stats_label.pack(fill=tk.X, padx=5, pady=(2, 4))
+        self.stats_tree = ttk.Treeview(panel, columns=("prize", "count", "rate", "since"), show="headings",
+                                       height=self.STATS_ROWS, selectmode="none")
+        self.stats_tree.heading("prize", text="奖品（按已抽出件数）")
+        self.stats_tree.heading("count", text="已抽出")
+        self.stats_tree.heading("rate", text=f"件/分钟（近{int(self.stats.window)}秒）")
+        self.stats_tree.heading("since", text="距上次抽中")
+        self.stats_tree.column("count", width=70, anchor=tk.E, stretch=False)
+        self.stats_tree.column("rate", width=130, anchor=tk.E, stretch=False)
+        self.stats_tree.column("since", width=90, anchor=tk.E, stretch=False)
+        self.stats_tree.pack(fill=tk.X, padx=5, pady=(0, 5))
+
+    def refresh_stats(self):
+        """按定时器刷新统计面板，与抽奖频率无关"""
+        if not self.exists():
+            return
+        stats = self.stats
+        now = stats.clock()
+        self.stats_label.config(
+            text=f"共抽出{stats.total}件，{len(stats.awarded)}种奖品；"
+                 f"近{int(stats.window)}秒{stats.rate(now=now):.1f}件/分钟；"
+                 f"距上次抽中{format_elapsed(stats.since_last(now=now))}")
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for name, count, rate, since in stats.top(self.STATS_ROWS, now):
+            self.stats_tree.insert("", "end", values=(name, count, f"{rate:.1f}", format_elapsed(since)))
+        self.win.after(self.STATS_INTERVAL, self.refresh_stats)
+
+    def _init_search_bar(self):
+        bar = ttk.Frame(self.win)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(bar, text="奖品").pack(side=tk.LEFT)
+        self.search_entry = ttk.Entry(bar, width=16)
+        self.search_entry.pack(side=tk.LEFT, padx=(4, 8))
+        self.search_range = []
+        for label in ("从", "到"):
+            ttk.Label(bar, text=label).pack(side=tk.LEFT)
+            entry = ttk.Entry(bar, width=12)
+            entry.pack(side=tk.LEFT, padx=(4, 8))
+            self.search_range.append(entry)
+        ttk.Button(bar, text="搜索", command=self.search).pack(side=tk.LEFT)
+        ttk.Button(bar, text="全部", command=self.clear_search).pack(side=tk.LEFT, padx=(4, 0))
+        for entry in [self.search_entry] + self.search_range:
+            entry.bind("<Return>", lambda e: self.search())
+
+    def search(self):
+        """按奖品名称前缀和时间段搜索，结果代替全部记录显示在列表里"""
+        try:
+            start_ts, end_ts = (parse_time(entry.get()) for entry in self.search_range)
+        except ValueError as e:
+            messagebox.showerror("搜索", str(e), parent=self.win)
+            return
+        prefix = self.search_entry.get().strip()
+        if not prefix and start_ts is None and end_ts is None:
+            self.clear_search()
+            return
+        started = time.perf_counter()
+        total, rows = self.source.search(prefix, start_ts, end_ts)
+        self.view = SearchResults(prefix, total, rows, time.perf_counter() - started)
+        self.scroll_to(0)
+
+    def clear_search(self):
+        self.search_entry.delete(0, tk.END)
+        for entry in self.search_range:
+            entry.delete(0, tk.END)
+        self.view = self.source
+        self.scroll_to(0)
+
+    def exists(self):
+        try:
+            return bool(self.win.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def row_count(self):
+        return len(self.view)
+
+    def show_page(self, total):
+        rows = self.view.read_recent(self.top, self.page_rows)
+        self.tree.delete(*self.tree.get_children())
+        for seq, ts, name in rows:
+            self.tree.insert("", "end", values=(seq, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)), name))
+        if self.export_job is None:
+            self._show_position(total, len(rows))
+        return len(rows)
+
+    def _show_position(self, total, shown):
+        if self.view is not self.source:
+            self.status.config(text=self.view.describe(self.top, shown))
+        elif total:
+            self.status.config(text=f"共{total}条，当前第{self.top + 1}-{self.top + shown}条（新的在前）")
+        else:
+            self.status.config(text="暂无中奖记录")
+
+    # ================= 导出 =================
+    def ask_export(self):
+        if self.export_job is not None:
+            messagebox.showinfo("导出", "正在导出，请稍候", parent=self.win)
+            return
+        dialog = tk.Toplevel(self.win)
+        dialog.title("导出中奖记录")
+        dialog.transient(self.win)
+        fields = {}
+        for row, (key, label, hint) in enumerate((
+                ("since", "开始时间", "如 2024-01-01 10:00 或 -2h，留空不限"),
+                ("until", "结束时间", "不含该时刻，留空不限"),
+                ("prize", "奖品", "留空为全部奖品"))):
+            ttk.Label(dialog, text=label).grid(row=row * 2, column=0, sticky=tk.W, padx=10, pady=(8, 0))
+            entry = ttk.Entry(dialog, width=32)
+            entry.grid(row=row * 2, column=1, padx=10, pady=(8, 0))
+            ttk.Label(dialog, text=hint, foreground="#888").grid(row=row * 2 + 1, column=1, sticky=tk.W, padx=10)
+            fields[key] = entry
+
+        def start():
+            try:
+                start_ts = parse_time(fields["since"].get())
+                end_ts = parse_time(fields["until"].get())
+            except ValueError as e:
+                messagebox.showerror("导出", str(e), parent=dialog)
+                return
+            path = filedialog.asksaveasfilename(
+                parent=dialog, title="导出到", defaultextension=".csv",
+                filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+            if not path:
+                return
+            dialog.destroy()
+            self.start_export(path, start_ts, end_ts, fields["prize"].get().strip() or None)
+
+        ttk.Button(dialog, text="导出", command=start).grid(row=6, column=1, sticky=tk.E, padx=10, pady=10)
+
+    def start_export(self, path, start_ts=None, end_ts=None, prize=None):
+        """在后台线程里流式导出，界面通过队列取进度"""
+        self.export_job = {"queue": queue.Queue(), "cancel": threading.Event(), "path": path}
+        job = self.export_job
+
+        def work():
+            try:
+                reader = self.open_reader()
+                try:
+                    count = export_history(reader, path, None, start_ts, end_ts, prize,
+                                           progress=lambda n: job["queue"].put(("progress", n)),
+                                           cancelled=job["cancel"].is_set)
+                finally:
+                    reader.close()
+                job["queue"].put(("done", count))
+            except Exception as e:
+                job["queue"].put(("error", e))
+
+        threading.Thread(target=work, daemon=True).start()
+        self.status.config(text="正在导出…")
+        self.win.bind("<Escape>", lambda e: job["cancel"].set())
+        self.win.after(100, self._poll_export)
+
+    def _poll_export(self):
+        if not self.exists():
+            return  # 窗口已关：后台线程照常写完文件
+        job = self.export_job
+        message = None
+        while True:
+            try:
+                message = job["queue"].get_nowait()
+            except queue.Empty:
+                break
+            if message[0] != "progress":
+                break
+            self.status.config(text=f"正在导出…已写出{message[1]}条（Esc取消）")
+        if message is None or message[0] == "progress":
+            self.win.after(100, self._poll_export)
+            return
+        self.export_job = None
+        self.win.unbind("<Escape>")
+        self.refresh()
+        if message[0] == "done":
+            messagebox.showinfo("导出", f"已导出{message[1]}条记录到{job['path']}", parent=self.win)
+        elif isinstance(message[1], InterruptedError):
+            messagebox.showinfo("导出", "导出已取消", parent=self.win)
+        else:
+            messagebox.showerror("导出", f"导出失败：{str(message[1])}", parent=self.win)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="抽奖程序")
+    parser.add_argument("--mode", choices=DrawEngine.MODES, default="weighted",
+                        help="weighted: 按剩余数量加权；ticket: 按洗牌奖券顺序")
+    parser.add_argument("--seed", type=int, help="随机数种子（会话模式下不指定则自动生成）")
+    parser.add_argument("--session-log", help="记录可回放的会话日志")
+    parser.add_argument("--watch", action="store_true", help="奖品表变化时自动热加载")
+    parser.add_argument("--journal", nargs="?", const="", metavar="PATH",
+                        help="记录扣减日志，崩溃重启后自动恢复剩余数量（默认写在奖品表旁的.journal文件）")
+    parser.add_argument("--db", metavar="PATH",
+                        help="库存和中奖记录存入SQLite数据库（首次使用时从奖品表导入，之后以数据库为准）")
+    parser.add_argument("--history", default="draw_history.bin", metavar="PATH",
+                        help="中奖记录文件（默认draw_history.bin；使用--db时记录在数据库中）")
+    parser.add_argument("--catalogue", help="奖品表路径，可为gzip/bz2/xz压缩文件（按内容识别），"
+                                            "默认prizes.csv，不存在时依次找prizes.csv.gz/.bz2/.xz")
+    args = parser.parse_args()
+    if args.session_log and args.journal is not None:
+        # 会话日志要求从奖品表的原始数量开始回放，与按扣减日志恢复后的库存对不上
+        parser.error("--session-log和--journal不能同时使用")
+    if args.db and (args.session_log or args.journal is not None or args.watch):
+        # 使用数据库时库存以数据库为准，不再对照奖品表回放、恢复或热加载
+        parser.error("--db不能与--session-log、--journal、--watch同时使用")
+    if args.session_log and args.seed is None:
+        args.seed = random.SystemRandom().getrandbits(64)
+
+    if sys.platform == "win32":
+        from ctypes import windll
+        windll.shcore.SetProcessDpiAwareness(1)
+    root = tk.Tk()
+    app = LotteryApp(root, mode=args.mode, seed=args.seed, session_log=args.session_log, watch=args.watch,
+                     catalogue=args.catalogue, journal=args.journal, db=args.db,
+                     history=args.history)
+    root.mainloop()
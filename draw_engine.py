@@ -0,0 +1,920 @@
+"""抽奖引擎：奖品加载、库存与抽奖算法，不依赖tkinter，可在批处理或服务中直接使用"""
+import random
+import math
+import csv
+import bz2
+import gzip
+import io
+import lzma
+import os
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate
+
+# ================= 抽奖算法 =================
+class LotteryAlgorithm:
+    @staticmethod
+    def weighted_random(prizes, rng=random):
+        """从库存(PrizeInventory)中按剩余数量加权选一个奖品（不扣减），返回PrizeView，无库存时返回None"""
+        index = prizes.pick(rng)
+        return None if index is None else prizes[index]
+
+    @staticmethod
+    def alias_sampler(prizes, rng=random):
+        """按库存(PrizeInventory)的当前数量构建别名表采样器"""
+        return AliasSampler(prizes.quantities, rng)
+
+    @staticmethod
+    def draw_many(prizes, k, rng=random):
+        """从库存(PrizeInventory)中一次不放回地抽出k件。
+
+        先按多元超几何分布把k拆分到各奖品，再打乱成抽出顺序；
+        返回下标列表，不修改库存，由调用方统一扣减。
+        """
+        k = min(k, prizes.total)
+        if k <= 0:
+            return []
+        counts = {}
+        # 沿下标区间二分拆分，只展开分到名额的区间
+        stack = [(0, len(prizes), prizes.total, k)]
+        while stack:
+            lo, hi, total, draws = stack.pop()
+            if hi - lo == 1:
+                counts[lo] = draws
+                continue
+            mid = (lo + hi) // 2
+            left_total = prizes.range_sum(lo, mid)
+            left = LotteryAlgorithm.hypergeometric(total, left_total, draws, rng)
+            if left:
+                stack.append((lo, mid, left_total, left))
+            if draws - left:
+                stack.append((mid, hi, total - left_total, draws - left))
+
+        winners = [i for i, c in counts.items() for _ in range(c)]
+        rng.shuffle(winners)
+        return winners
+
+    @staticmethod
+    def hypergeometric(total, good, draws, rng=random):
+        """从total件（其中good件命中）中不放回抽draws件，返回命中件数"""
+        bad = total - good
+        lo = max(0, draws - bad)
+        hi = min(good, draws)
+        if lo >= hi:
+            return lo
+
+        def log_comb(n, r):
+            return math.lgamma(n + 1) - math.lgamma(r + 1) - math.lgamma(n - r + 1)
+
+        mode = min(max((draws + 1) * (good + 1) // (total + 2), lo), hi)
+        p_mode = math.exp(log_comb(good, mode) + log_comb(bad, draws - mode) - log_comb(total, draws))
+        # 从众数向两侧交替累减概率（期望步数与标准差同阶）
+        u = rng.random() - p_mode
+        if u <= 0:
+            return mode
+        down = up = mode
+        p_down = p_up = p_mode
+        while down > lo or up < hi:
+            if up < hi:
+                p_up *= (good - up) * (draws - up) / ((up + 1) * (bad - draws + up + 1))
+                up += 1
+                u -= p_up
+                if u <= 0:
+                    return up
+            if down > lo:
+                p_down *= down * (bad - draws + down) / ((good - down + 1) * (draws - down + 1))
+                down -= 1
+                u -= p_down
+                if u <= 0:
+                    return down
+        return mode
+
+# ================= 别名表采样 =================
+class AliasSampler:
+    """Vose别名表：每次抽取O(1)。
+
+    库存减少时不重建表，而是按 当前数量/建表数量 接受抽中的项（拒绝采样），
+    分布与按当前库存加权完全一致；剩余总量降到建表时的一半或出现补货时才重建。
+    """
+    def __init__(self, weights, rng=random):
+        self.rng = rng
+        self.weights = list(weights)
+        self.rebuild()
+
+    def rebuild(self):
+        weights = self.weights
+        # 只对有库存的项建表，重建代价与有效奖品数成正比
+        ids = [i for i, w in enumerate(weights) if w > 0]
+        total = sum(weights[i] for i in ids)
+        n = len(ids)
+        self._ids = ids
+        self._base = {i: weights[i] for i in ids}
+        self._base_total = total
+        self.total = total
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        if not n:
+            return
+
+        scaled = [weights[i] * n / total for i in ids]
+        small = [k for k, p in enumerate(scaled) if p < 1]
+        large = [k for k, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+
+    def update(self, index, quantity):
+        """同步某项的最新数量"""
+        old = self.weights[index]
+        self.weights[index] = quantity
+        self.total += quantity - old
+        if quantity > self._base.get(index, 0):
+            # 补货超过建表值，拒绝采样不再成立
+            self.rebuild()
+        elif self.total * 2 < self._base_total:
+            # 接受率低于一半时重建，均摊仍为O(1)
+            self.rebuild()
+
+    def sample(self):
+        """返回抽中项的下标，全部抽完时返回None"""
+        if self.total <= 0:
+            return None
+        rng = self.rng
+        n = len(self._ids)
+        while True:
+            k = int(rng.random() * n)
+            if rng.random() >= self._prob[k]:
+                k = self._alias[k]
+            index = self._ids[k]
+            weight = self.weights[index]
+            base = self._base[index]
+            if weight >= base or rng.random() * base < weight:
+                return index
+
+# ================= 奖品库存（树状数组） =================
+def _column(buf):
+    """把array或memoryview复制成独立的array('q')"""
+    column = array('q')
+    column.frombytes(memoryview(buf).cast("B"))
+    return column
+
+
+class PrizeView:
+    """库存中某个奖品的轻量视图，只保存下标，读取时直接访问库存数组"""
+    __slots__ = ("inventory", "index")
+
+    def __init__(self, inventory, index):
+        self.inventory = inventory
+        self.index = index
+
+    @property
+    def name(self):
+        return self.inventory.name(self.index)
+
+    @property
+    def quantity(self):
+        return self.inventory.quantities[self.index]
+
+    def __repr__(self):
+        return f"PrizeView({self.name!r}, {self.quantity})"
+
+
+class PrizeInventory:
+    """按奖品顺序保存数量，并用树状数组(Fenwick)维护前缀和。
+
+    按库存加权抽取 + 扣减一次为O(log n)，与奖品种类多少无关。
+    另外维护"有库存奖品"下标集合，数量归零时移出、补货时移回，
+    滚动动画等只需随机取一个有效奖品的场景可以O(1)读取。
+
+    数据按列存放：名称拼成一段UTF-8字节串加偏移表，数量、树、有效集合都是
+    array('q')，每个奖品只占几十字节；按下标取用时返回PrizeView而不是dict。
+    """
+    def __init__(self, items=()):
+        self._names = bytearray()
+        self._name_offsets = array('q', [0])
+        self.quantities = array('q')
+        self._tree = array('q', [0])  # 1-based
+        self.total = 0
+        self._active = array('q')       # 有库存的奖品下标
+        self._active_pos = array('q')   # 下标在_active中的位置，-1表示无库存
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return PrizeView(self, index)
+
+    def __iter__(self):
+        return (PrizeView(self, i) for i in range(len(self)))
+
+    @classmethod
+    def from_buffers(cls, names, offsets, quantities, tree, active, active_pos, total):
+        """直接以现成的列数据（如内存映射快照中的memoryview）构造库存，不做任何扫描"""
+        inventory = cls.__new__(cls)
+        inventory._names = names
+        inventory._name_offsets = offsets
+        inventory.quantities = quantities
+        inventory._tree = tree
+        inventory.total = total
+        inventory._active = _column(active)  # 需要pop，总是用array
+        inventory._active_pos = active_pos
+        return inventory
+
+    def columns(self):
+        """返回各列数据，供快照等序列化使用"""
+        return {
+            "names": self._names,
+            "offsets": self._name_offsets,
+            "quantities": self.quantities,
+            "tree": self._tree,
+            "active": self._active,
+            "active_pos": self._active_pos,
+        }
+
+    def _ensure_growable(self):
+        # 映射自快照的列是定长memoryview，追加前转成可增长的array
+        if not isinstance(self.quantities, array):
+            self._names = bytearray(self._names)
+            self._name_offsets = _column(self._name_offsets)
+            self.quantities = _column(self.quantities)
+            self._tree = _column(self._tree)
+            self._active_pos = _column(self._active_pos)
+
+    def items(self, start=0, stop=None):
+        """按顺序产出(name, quantity)"""
+        offsets = self._name_offsets
+        names = self._names
+        quantities = self.quantities
+        for i in range(start, len(self) if stop is None else stop):
+            yield str(names[offsets[i]:offsets[i + 1]], "utf-8"), quantities[i]
+
+    def name(self, index):
+        offsets = self._name_offsets
+        return str(self._names[offsets[index]:offsets[index + 1]], "utf-8")
+
+    def quantity(self, index):
+        return self.quantities[index]
+
+    def extend(self, items):
+        """批量追加(name, quantity)，线性时间建树"""
+        self._ensure_growable()
+        tree = self._tree
+        names = self._names
+        offsets = self._name_offsets
+        quantities = self.quantities
+        active = self._active
+        active_pos = self._active_pos
+        old_n = len(quantities)
+        total = 0
+        for name, quantity in items:
+            names += name.encode("utf-8")
+            offsets.append(len(names))
+            if quantity > 0:
+                active_pos.append(len(active))
+                active.append(len(quantities))
+            else:
+                active_pos.append(-1)
+            quantities.append(quantity)
+            tree.append(quantity)
+            total += quantity
+        self.total += total
+        self._link_tree(old_n)
+
+    def extend_columns(self, names, ends, quantities):
+        """按列批量追加：names为UTF-8名称串，ends为各名称在names中的结束偏移"""
+        self._ensure_growable()
+        base = len(self._names)
+        old_n = len(self.quantities)
+        self._names += names
+        if base:
+            self._name_offsets.extend(base + end for end in ends)
+        else:
+            self._name_offsets.extend(ends)
+        self.quantities.extend(quantities)
+        self._tree.extend(quantities)
+        active = self._active
+        active_pos = self._active_pos
+        for i, quantity in enumerate(quantities, old_n):
+            if quantity > 0:
+                active_pos.append(len(active))
+                active.append(i)
+            else:
+                active_pos.append(-1)
+        self.total += sum(quantities)
+        self._link_tree(old_n)
+
+    def _link_tree(self, old_n):
+        """新追加的叶子（old_n之后）已按原值写入树数组，这里把它们累加进父节点"""
+        tree = self._tree
+        n = len(self.quantities)
+        if n == old_n:
+            return
+        # 旧节点中父节点落在新区间的只有右侧一条链（至多log n个）
+        i = old_n
+        while i > 0:
+            parent = i + (i & -i)
+            if old_n < parent <= n:
+                tree[parent] += tree[i]
+            i -= i & -i
+        for i in range(old_n + 1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+
+    def append(self, name, quantity):
+        self.extend(((name, quantity),))
+
+    def copy(self):
+        """复制一份独立的库存（模拟时每场活动各用一份，名称数据共享）"""
+        other = PrizeInventory.__new__(PrizeInventory)
+        other._names = self._names
+        other._name_offsets = self._name_offsets
+        other.quantities = _column(self.quantities)
+        other._tree = _column(self._tree)
+        other.total = self.total
+        other._active = _column(self._active)
+        other._active_pos = _column(self._active_pos)
+        return other
+
+    def memory_usage(self):
+        """各列实际占用的字节数（不含Python对象头）"""
+        return sum(memoryview(buf).nbytes for buf in (
+            self._name_offsets, self.quantities, self._tree, self._active, self._active_pos)) + len(self._names)
+
+    def _activate(self, index):
+        self._active_pos[index] = len(self._active)
+        self._active.append(index)
+
+    def _deactivate(self, index):
+        # 与末尾交换后弹出，O(1)
+        pos = self._active_pos[index]
+        last = self._active.pop()
+        if last != index:
+            self._active[pos] = last
+            self._active_pos[last] = pos
+        self._active_pos[index] = -1
+
+    @property
+    def active_count(self):
+        """有库存的奖品种类数"""
+        return len(self._active)
+
+    def random_active(self, rng=random):
+        """等概率返回一个有库存奖品的下标（不按数量加权），无库存时返回None"""
+        if not self._active:
+            return None
+        return self._active[int(rng.random() * len(self._active))]
+
+    def add(self, index, delta):
+        """数量增减delta，O(log n)"""
+        old = self.quantities[index]
+        self.quantities[index] = old + delta
+        self.total += delta
+        if old <= 0 < old + delta:
+            self._activate(index)
+        elif old + delta <= 0 < old:
+            self._deactivate(index)
+        tree = self._tree
+        n = len(tree) - 1
+        i = index + 1
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def set_quantity(self, index, quantity):
+        self.add(index, quantity - self.quantities[index])
+
+    def subtract_counts(self, counts):
+        """按{下标: 件数}批量扣减。涉及的奖品多时直接改数量再线性重建树和有库存索引，
+        比逐个O(log n)更新快得多（崩溃恢复时一次扣回大量记录）"""
+        n = len(self.quantities)
+        if len(counts) * max(1, n.bit_length()) < n:
+            for index, count in counts.items():
+                self.add(index, -count)
+            return
+        self._ensure_growable()
+        quantities = self.quantities
+        for index, count in counts.items():
+            quantities[index] -= count
+        self._tree = array('q', [0])
+        self._tree.extend(quantities)
+        self._link_tree(0)
+        self._active = array('q', [i for i, quantity in enumerate(quantities) if quantity > 0])
+        self._active_pos = array('q', [-1]) * n
+        for pos, index in enumerate(self._active):
+            self._active_pos[index] = pos
+        self.total = sum(quantities)
+
+    def prefix_sum(self, index):
+        """前index个奖品的数量之和"""
+        tree = self._tree
+        s = 0
+        i = index
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def range_sum(self, lo, hi):
+        return self.prefix_sum(hi) - self.prefix_sum(lo)
+
+    def find(self, r):
+        """返回满足 prefix_sum(i+1) > r 的最小下标i（0 <= r < total）"""
+        tree = self._tree
+        n = len(tree) - 1
+        pos = 0
+        step = 1 << n.bit_length() - 1 if n else 0
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= r:
+                pos = nxt
+                r -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def pick(self, rng=random):
+        """按剩余数量加权选一个下标（不扣减），无库存时返回None"""
+        if not self._active:
+            return None
+        return self.find(rng.randrange(self.total))
+
+    def draw(self, rng=random):
+        """按剩余数量加权抽取并扣减一件，返回下标"""
+        index = self.pick(rng)
+        if index is not None:
+            self.add(index, -1)
+        return index
+
+    def take(self, indices):
+        """按下标列表扣减库存，同一奖品只更新一次"""
+        counts = Counter(indices)
+        for index, count in counts.items():
+            self.add(index, -count)
+        return counts
+
+# ================= 可计数随机数源 =================
+class CountingRandom(random.Random):
+    """带种子的随机数流，position记录已消耗的随机数次数，用于回放核对"""
+    def __init__(self, seed=None):
+        self.position = 0
+        super().__init__(seed)
+
+    def random(self):
+        self.position += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.position += 1
+        return super().getrandbits(k)
+
+# ================= 惰性洗牌奖券 =================
+class TicketStream:
+    """奖券模式：效果等同于把每件奖品展开成一张券后整体洗牌、依次抽出，
+    但不真正展开奖池。
+
+    在虚拟券号空间[0, size)上做稀疏交换的Fisher–Yates，只记录被交换过的位置，
+    内存与已抽次数成正比，而不是与奖品总件数成正比。
+    """
+    def __init__(self, quantities, rng=random):
+        self.rng = rng
+        self._bounds = list(accumulate(quantities))
+        self.size = self._bounds[-1] if self._bounds else 0
+        self.drawn = 0
+        self._swaps = {}
+
+    def __len__(self):
+        return self.size - self.drawn
+
+    def next_ticket(self):
+        """取下一张券号，全部抽完时返回None"""
+        i = self.drawn
+        if i >= self.size:
+            return None
+        j = self.rng.randrange(i, self.size)
+        swaps = self._swaps
+        ticket = swaps.get(j, j)
+        if j != i:
+            swaps[j] = swaps.get(i, i)
+        swaps.pop(i, None)
+        self.drawn = i + 1
+        return ticket
+
+    def prize_of(self, ticket):
+        """券号对应的奖品下标"""
+        return bisect_right(self._bounds, ticket)
+
+    def draw(self):
+        ticket = self.next_ticket()
+        if ticket is None:
+            return None
+        return self.prize_of(ticket)
+
+# ================= 奖品加载 =================
+BATCH_SIZE = 8192
+
+
+class LoadErrors:
+    """加载错误汇总：总数照常累计，但只保留前limit条作为样本，内存有上限"""
+    def __init__(self, limit=100):
+        self.limit = limit
+        self.count = 0
+        self.samples = []
+
+    def add(self, line_num, message):
+        self.count += 1
+        if len(self.samples) < self.limit:
+            self.samples.append(f"第{line_num}行错误：{message}")
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def __getitem__(self, index):
+        return self.samples[index]
+
+
+def prize_columns(header):
+    """从表头行找出name和quantity两列的位置，缺列时抛出ValueError"""
+    header = [column.strip() for column in header]
+    if 'name' not in header or 'quantity' not in header:
+        raise ValueError("CSV文件必须包含name和quantity两列")
+    return header.index('name'), header.index('quantity')
+
+
+def iter_prize_batches(f, batch_size=BATCH_SIZE, errors=None, columns=None):
+    """从文本流中逐行解析奖品，每攒够batch_size行产出一批[(name, quantity), ...]。
+
+    空行和#开头的注释行跳过；行号为文件中的实际行号。缺列时抛出ValueError。
+    columns为(name列, quantity列)时视为没有表头的片段（并行解析时使用），行号从片段开头算起。
+    """
+    if errors is None:
+        errors = LoadErrors()
+    line_num = 0
+
+    def lines():
+        nonlocal line_num
+        for line in f:
+            line_num += 1
+            if line.strip() and not line.startswith('#'):
+                yield line
+
+    reader = csv.reader(lines())
+    name_col, quantity_col = columns or prize_columns(next(reader, []))
+
+    batch = []
+    for row in reader:
+        try:
+            if len(row) <= max(name_col, quantity_col):
+                raise ValueError("列数不足")
+            name = row[name_col].strip()
+            quantity = row[quantity_col].strip()
+
+            if not name:
+                raise ValueError("奖品名称不能为空")
+            if not quantity:
+                raise ValueError("数量不能为空")
+
+            quantity = int(quantity)
+            if quantity < 0:
+                raise ValueError("数量不能为负数")
+
+            batch.append((name, quantity))
+        except Exception as e:
+            errors.add(line_num, str(e))
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# 压缩格式按文件开头的魔数识别，与扩展名无关
+MAGIC_NUMBERS = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+DECOMPRESSORS = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+CATALOGUE_SUFFIXES = ("", ".gz", ".bz2", ".xz")
+
+
+def detect_compression(raw):
+    """根据魔数判断二进制流的压缩格式，返回"gzip"/"bz2"/"xz"，未压缩返回None（不移动读取位置）"""
+    head = raw.peek(6)[:6]
+    for magic, codec in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def decode_catalogue(raw):
+    """把奖品表的二进制流包装成文本流：压缩文件边读边解压，不会整体解压到内存"""
+    codec = detect_compression(raw)
+    if codec is not None:
+        raw = DECOMPRESSORS[codec](raw, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+def find_catalogue(path="prizes.csv"):
+    """path不存在时依次尝试.gz/.bz2/.xz压缩版本，都没有时原样返回path"""
+    for suffix in CATALOGUE_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def load_prizes(path="prizes.csv", batch_size=BATCH_SIZE, error_limit=100):
+    """流式读取奖品CSV（可为gzip/bz2/xz压缩），分批直接写入库存，返回(库存, LoadErrors)；缺列时抛出ValueError"""
+    inventory = PrizeInventory()
+    errors = LoadErrors(error_limit)
+    with open(path, "rb") as raw, decode_catalogue(raw) as f:
+        for batch in iter_prize_batches(f, batch_size, errors):
+            inventory.extend(batch)
+    return inventory, errors
+
+def read_catalogue(path="prizes.csv", error_limit=100):
+    """读取奖品表为{名称: 数量}（同名行数量相加），供热加载比对使用"""
+    rows = {}
+    errors = LoadErrors(error_limit)
+    with open(path, "rb") as raw, decode_catalogue(raw) as f:
+        for batch in iter_prize_batches(f, errors=errors):
+            for name, quantity in batch:
+                rows[name] = rows.get(name, 0) + quantity
+    return rows, errors
+
+
+class CatalogueDiff:
+    """一次热加载实际改动的奖品下标"""
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+class CataloguePlan:
+    """热加载要应用的差异，由DrawEngine.plan_catalogue算出，主线程交给apply_plan应用"""
+    def __init__(self):
+        self.added = []    # (名称, 数量)：新增的奖品
+        self.changed = []  # (同名各行下标, 原始数量之差)：数量变了或重新上架的奖品
+        self.removed = []  # 同名各行下标：表中删除的奖品
+
+
+# ================= 抽奖引擎 =================
+class DrawEngine:
+    """持有库存与随机数源，界面层只负责展示。
+
+    mode="weighted" 按剩余数量加权抽取；mode="ticket" 按惰性洗牌的奖券顺序抽取，
+    两者对每件奖品都是等概率的，只是随机数的使用方式不同。
+    """
+    MODES = ("weighted", "ticket")
+
+    def __init__(self, rng=None, mode="weighted", seed=None):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的抽奖模式：{mode}")
+        self.seed = seed
+        self.rng = rng or CountingRandom(seed)
+        self.mode = mode
+        self.inventory = PrizeInventory()
+        self.tickets = None
+        self.session = None  # 会话日志，见draw_session.SessionLog
+        self.journal = None  # 扣减记录，见draw_journal.DrawJournal或draw_store.SqliteStore
+        self.history = None  # 中奖历史，见draw_history.HistoryLog
+        self.stats = None  # 实时统计，见draw_stats.PrizeStats
+        self.removed = set()  # 热加载时已从奖品表删除的奖品下标
+        self._baseline = array('q')  # 奖品表中的原始数量（未扣减）
+        self._name_index = None
+
+    def load(self, path="prizes.csv"):
+        """加载奖品，返回LoadErrors（错误总数与样本）"""
+        inventory, errors = load_prizes(path)
+        self.use_inventory(inventory)
+        return errors
+
+    def use_inventory(self, inventory):
+        """换用外部加载好的库存（如来自快照）"""
+        self.inventory = inventory
+        self.removed = set()
+        self._baseline = _column(inventory.quantities)
+        self._name_index = None
+        self.reset_tickets()
+
+    def _names(self):
+        # 名称 -> 下标列表，首次热加载时才建立
+        if self._name_index is None:
+            index = {}
+            inventory = self.inventory
+            for i in range(len(inventory)):
+                name = inventory.name(i)
+                if name in index:
+                    index[name].append(i)
+                else:
+                    index[name] = [i]
+            self._name_index = index
+        return self._name_index
+
+    def plan_catalogue(self, rows):
+        """按名称把新的奖品表{名称: 数量}与上次加载时的数量比对，返回CataloguePlan。
+
+        只读名称索引和原始数量，不动库存，可在后台线程调用，期间主线程照常抽奖；
+        比对要遍历全部奖品，放在后台做，主线程的apply_plan只处理有变化的那些。
+        """
+        baseline = self._baseline
+        index = self._names()
+        removed = self.removed
+        plan = CataloguePlan()
+        for name, quantity in rows.items():
+            indices = index.get(name)
+            if indices is None:
+                plan.added.append((name, quantity))
+                continue
+            if len(indices) == 1:
+                delta = quantity - baseline[indices[0]]
+            else:
+                delta = quantity - sum(baseline[i] for i in indices)
+            if delta or (removed and indices[0] in removed):
+                plan.changed.append((indices, delta))
+        for name, indices in index.items():
+            if name not in rows and not (removed and indices[0] in removed):
+                plan.removed.append(indices)
+        return plan
+
+    def apply_plan(self, plan):
+        """应用plan_catalogue算出的差异，返回CatalogueDiff。
+
+        新表与上次加载时的数量之差加到剩余数量上（不低于0），已抽出的件数保持不变；
+        新增的奖品追加到末尾，表中删除的奖品剩余数量清零并标记为已下架。
+        """
+        inventory = self.inventory
+        baseline = self._baseline
+        index = self._names()
+        removed = self.removed
+        diff = CatalogueDiff()
+        deltas = []
+
+        for name, quantity in plan.added:
+            inventory.append(name, quantity)
+            baseline.append(quantity)
+            i = len(inventory) - 1
+            index[name] = [i]
+            diff.added.append(i)
+
+        for indices, delta in plan.changed:
+            removed.difference_update(indices)
+            baseline[indices[0]] += delta
+            for i, d in self._spread(indices, delta):
+                inventory.add(i, d)
+                deltas.append((i, d))
+            diff.changed.extend(indices)
+
+        for indices in plan.removed:
+            for i in indices:
+                baseline[i] = 0
+                removed.add(i)
+                if inventory.quantities[i]:
+                    deltas.append((i, -inventory.quantities[i]))
+                    inventory.add(i, -inventory.quantities[i])
+            diff.removed.extend(indices)
+
+        if diff:
+            self.reset_tickets()
+            if self.session is not None:
+                self.session.record_reload(self.position, plan.added, deltas)
+        return diff
+
+    def apply_catalogue(self, rows):
+        """比对并应用新的奖品表{名称: 数量}，返回CatalogueDiff（同一线程里一次做完）"""
+        return self.apply_plan(self.plan_catalogue(rows))
+
+    def _spread(self, indices, delta):
+        """把数量变化分配到同名的各行：增加记在第一行，减少依次扣到0为止"""
+        if delta >= 0:
+            return [(indices[0], delta)]
+        result = []
+        for i in indices:
+            take = max(delta, -self.inventory.quantities[i])
+            if take:
+                result.append((i, take))
+                delta -= take
+            if not delta:
+                break
+        return result
+
+    def apply_reload(self, added, deltas):
+        """按会话日志中记录的热加载结果直接修改库存（回放用）"""
+        for name, quantity in added:
+            self.inventory.append(name, quantity)
+        for i, d in deltas:
+            self.inventory.add(i, d)
+        self.reset_tickets()
+
+    def reset_tickets(self):
+        """库存变化（加载、补货）后作废当前奖券流，下次抽奖时按当时库存重新发券"""
+        self.tickets = None
+
+    def _ticket_stream(self):
+        if self.mode != "ticket":
+            return None
+        if self.tickets is None:
+            self.tickets = TicketStream(self.inventory.quantities, self.rng)
+        return self.tickets
+
+    def begin_load(self):
+        """开始分批加载：换成空库存，之后用add_rows逐批追加"""
+        self.use_inventory(PrizeInventory())
+
+    def add_rows(self, rows):
+        """分批加载时追加一批(name, quantity)，追加后即可参与抽奖"""
+        start = len(self.inventory)
+        self.inventory.extend(rows)
+        self._baseline.extend(quantity for _, quantity in rows)
+        if self._name_index is not None:
+            for i, (name, _) in enumerate(rows, start):
+                self._name_index.setdefault(name, []).append(i)
+        self.reset_tickets()
+
+    @property
+    def remaining(self):
+        return self.inventory.total
+
+    def preview(self, rng=random):
+        """滚动动画用：随机取一个仍有库存的奖品名称"""
+        index = self.inventory.random_active(rng)
+        if index is None:
+            return None
+        return self.inventory.name(index)
+
+    @property
+    def position(self):
+        """随机数流当前位置（非CountingRandom时为None）"""
+        return getattr(self.rng, "position", None)
+
+    def draw_index(self):
+        """抽取一件，返回奖品下标；已抽完时返回None"""
+        position = self.position
+        tickets = self._ticket_stream()
+        if tickets is not None:
+            index = tickets.draw()
+            if index is not None:
+                self.inventory.add(index, -1)
+        else:
+            index = self.inventory.draw(self.rng)
+        if index is not None:
+            if self.journal is not None:
+                self.journal.record(self.inventory, (index,))
+            if self.history is not None:
+                self.history.record(self.inventory, (index,))
+            if self.stats is not None:
+                self.stats.record(self.inventory, (index,))
+        if self.session is not None:
+            self.session.record_draw(position, index, None if index is None else self.inventory.name(index))
+        return index
+
+    def draw(self):
+        """抽取一件，返回奖品名称；已抽完时返回None"""
+        index = self.draw_index()
+        if index is None:
+            return None
+        return self.inventory.name(index)
+
+    def draw_many_indices(self, k):
+        """不放回抽取k件，返回按抽出顺序的下标列表（记入会话日志）。
+
+        不扣减库存，也不写扣减日志、中奖记录和统计：调用方需自行inventory.take(winners)，
+        一般直接用draw_many。
+        """
+        position = self.position
+        tickets = self._ticket_stream()
+        if tickets is not None:
+            winners = [tickets.draw() for _ in range(min(k, len(tickets)))]
+        else:
+            winners = LotteryAlgorithm.draw_many(self.inventory, k, self.rng)
+        if self.session is not None:
+            self.session.record_batch(position, k, winners)
+        return winners
+
+    def draw_many(self, k):
+        """不放回抽取k件，返回(按抽出顺序的名称列表, 各奖品下标计数)"""
+        winners = self.draw_many_indices(k)
+        counts = self.inventory.take(winners)
+        if self.journal is not None:
+            self.journal.record(self.inventory, winners)
+        if self.history is not None:
+            self.history.record(self.inventory, winners)
+        if self.stats is not None:
+            self.stats.record(self.inventory, winners)
+        return [self.inventory.name(i) for i in winners], counts
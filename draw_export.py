@@ -0,0 +1,136 @@
+"""中奖记录导出：按时间段、奖品筛选，流式写成CSV或JSONL，内存占用与记录条数无关
+
+    python draw_export.py -o winners.csv                          # 导出draw_history.bin中的全部记录
+    python draw_export.py --db draw.db -o winners.jsonl --since=-2h --prize 一等奖
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from draw_history import HistoryLog
+from draw_store import SqliteStore
+
+FORMATS = ("csv", "jsonl")
+CHUNK_ROWS = 8192  # 每攒够这么多行写一次文件并报告进度
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+RELATIVE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_time(text, now=None):
+    """解析时间：支持"2024-01-01 10:00[:00]"、"2024-01-01"，以及相对当前的"-30m"、"-2h"、"-1d"；空串返回None"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text[0] == "-" and text[-1] in RELATIVE_UNITS:
+        try:
+            return (time.time() if now is None else now) - float(text[1:-1]) * RELATIVE_UNITS[text[-1]]
+        except ValueError:
+            pass
+    for fmt in TIME_FORMATS:
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的时间：{text}")
+
+
+def format_for(path):
+    return "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+
+
+def export_history(source, path, fmt=None, start_ts=None, end_ts=None, prize=None,
+                   progress=None, cancelled=None):
+    """把source中[start_ts, end_ts)、奖品为prize（None为不限）的记录写入path，返回写出的条数。
+
+    source需提供iter_range(start_ts, end_ts)，按时间顺序产出(序号, 时间戳, 名称)。
+    每写一块调用progress(已写条数)；cancelled()返回真时抛出InterruptedError中止。
+    先写临时文件，完成后再替换目标文件，中途失败或中止不会留下半个文件。
+    """
+    fmt = fmt or format_for(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}")
+    tmp_path = path + ".tmp"
+    written = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f) if fmt == "csv" else None
+            if writer is not None:
+                writer.writerow(("seq", "time", "timestamp", "prize"))
+            chunk = []
+            second, when = None, ""
+            for seq, ts, name in source.iter_range(start_ts, end_ts):
+                if prize is not None and name != prize:
+                    continue
+                if int(ts) != second:
+                    # 同一秒内的记录很多，时间字符串按秒缓存
+                    second = int(ts)
+                    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+                if writer is not None:
+                    chunk.append((seq, when, f"{ts:.6f}", name))
+                else:
+                    chunk.append(json.dumps({"seq": seq, "time": when, "timestamp": ts, "prize": name},
+                                            ensure_ascii=False) + "\n")
+                if len(chunk) >= CHUNK_ROWS:
+                    written += _flush(f, writer, chunk)
+                    if progress is not None:
+                        progress(written)
+                    if cancelled is not None and cancelled():
+                        raise InterruptedError("导出已取消")
+            written += _flush(f, writer, chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if progress is not None:
+        progress(written)
+    return written
+
+
+def _flush(f, writer, chunk):
+    n = len(chunk)
+    if writer is not None:
+        writer.writerows(chunk)
+    else:
+        f.writelines(chunk)
+    chunk.clear()
+    return n
+
+
+def open_source(history=None, db=None):
+    """打开导出用的记录源（只读用途，可在后台线程里单独打开）"""
+    if db:
+        return SqliteStore(db)
+    return HistoryLog(history or "draw_history.bin", readonly=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出中奖记录")
+    parser.add_argument("history", nargs="?", default="draw_history.bin", help="中奖记录文件")
+    parser.add_argument("--db", help="从SQLite数据库导出（与抽奖程序的--db相同）")
+    parser.add_argument("-o", "--output", required=True, help="输出文件，.jsonl为JSONL，其余为CSV")
+    parser.add_argument("--format", choices=FORMATS, help="输出格式，默认按扩展名判断")
+    parser.add_argument("--since", help="开始时间（含），如\"2024-01-01 10:00\"；相对时间写成--since=-2h")
+    parser.add_argument("--until", help="结束时间（不含）")
+    parser.add_argument("--prize", help="只导出该奖品")
+    args = parser.parse_args(argv)
+
+    try:
+        start_ts, end_ts = parse_time(args.since), parse_time(args.until)
+    except ValueError as e:
+        parser.error(str(e))
+    source = open_source(args.history, args.db)
+    start = time.perf_counter()
+    try:
+        count = export_history(source, args.output, args.format, start_ts, end_ts, args.prize)
+    finally:
+        source.close()
+    print(f"已导出{count}条记录到{args.output}，用时{time.perf_counter() - start:.2f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
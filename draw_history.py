@@ -0,0 +1,609 @@
+"""中奖历史：分段的追加写记录文件，配合时间索引按时间段快速查询
+
+文件布局：
+    <历史>.manifest             分段清单（JSON）：各段的文件名、起始位置、条数、时间范围，最后一段为写入段
+    <历史>.<起始位置>            写入段（以及封存后尚未压缩的段）：定长记录RECORD[...]，
+                                序号int64、时间戳float64、名称编号int32（小端）
+    <历史>.<起始位置>.z          压缩段：每BLOCK_RECORDS条一块（时间戳列+名称编号列，zlib压缩），
+                                文件末尾是块索引（每块首条时间戳、偏移、长度）和PACK_TRAILER
+    <历史>.names                名称表，每行一个名称，行号（从0起）即名称编号
+
+写入段满segment_records条或跨度满segment_seconds秒时封存、新开一段，封存的段由后台线程压缩。
+时间戳单调不减，按时间查询时先用清单里各段的时间范围找到起始段，段内再用稀疏索引（写入段）
+或块索引（压缩段）定位，只读相关的块；启动时只读清单和名称表，不扫描记录。
+按奖品名称（前缀）搜索用内存中的名称索引（名称编号 -> 位置列表），启动后在后台扫描建立，之后随追加更新。
+旧版本的单个历史文件在第一次打开时作为第一段接管。
+写入直接交给操作系统（O_APPEND），进程崩溃不会丢失已写入的记录。
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+
+# 序号, 时间戳, 名称编号
+RECORD = struct.Struct("<qdi4x")
+INDEX_STRIDE = 1024
+READ_BLOCK = 4096  # 顺序读取时每次读入的记录数
+SEGMENT_RECORDS = 1 << 20
+SEGMENT_SECONDS = 24 * 3600
+BLOCK_RECORDS = 4096  # 压缩段每块的记录数
+PACK_MAGIC = b"DRAWHSZ1"
+# 每块：首条时间戳, 偏移, 压缩后长度
+BLOCK_ENTRY = struct.Struct("<dqq")
+# magic, 块索引偏移, 块数, 条数
+PACK_TRAILER = struct.Struct("<8sqqq")
+MANIFEST_VERSION = 1
+SEARCH_LIMIT = 1000  # 搜索最多返回的条数
+
+
+def names_path_for(path):
+    return path + ".names"
+
+
+def manifest_path_for(path):
+    return path + ".manifest"
+
+
+def _bisect(side):
+    return bisect_left if side == "left" else bisect_right
+
+
+# ================= 段 =================
+class RawSegment:
+    """未压缩的段：定长记录，按位置直接定位；时间索引每INDEX_STRIDE条一项，第一次按时间查询时才建立"""
+    packed = False
+
+    def __init__(self, path, first, readonly=True):
+        self.path = path
+        self.first = first  # 第一条记录在整个历史中的位置
+        if readonly:
+            self.fd = os.open(path, os.O_RDONLY)
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self.fd).st_size
+        if size % RECORD.size:
+            # 截掉崩溃时写了一半的记录
+            size -= size % RECORD.size
+            if not readonly:
+                os.ftruncate(self.fd, size)
+        self.count = size // RECORD.size
+        self._index_ts = None  # 第k项为第k*INDEX_STRIDE条记录的时间戳
+        self.start_ts = self.read_ts(0) if self.count else None
+        self.end_ts = self.read_ts(self.count - 1) if self.count else None
+
+    def read_ts(self, pos):
+        return RECORD.unpack(os.pread(self.fd, RECORD.size, pos * RECORD.size))[1]
+
+    def _index(self):
+        if self._index_ts is None:
+            self._index_ts = [self.read_ts(pos) for pos in range(0, self.count, INDEX_STRIDE)]
+        return self._index_ts
+
+    def append(self, chunk, n, ts):
+        """追加n条已打包的记录（同一时间戳ts）"""
+        os.write(self.fd, chunk)
+        old_count = self.count
+        self.count += n
+        if self._index_ts is not None:
+            for pos in range(-(-old_count // INDEX_STRIDE) * INDEX_STRIDE, self.count, INDEX_STRIDE):
+                self._index_ts.append(ts)
+        if not old_count:
+            self.start_ts = ts
+        self.end_ts = ts
+
+    def rows(self, start, stop):
+        """段内第start到stop-1条的(时间戳, 名称编号)，分块读取"""
+        pos = start
+        while pos < stop:
+            n = min(READ_BLOCK, stop - pos)
+            data = os.pread(self.fd, n * RECORD.size, pos * RECORD.size)
+            for _, ts, name_id in RECORD.iter_unpack(data):
+                yield ts, name_id
+            pos += n
+
+    def name_id_blocks(self):
+        """按块产出本段全部记录的名称编号array（建立名称索引用）"""
+        for pos in range(0, self.count, READ_BLOCK):
+            n = min(READ_BLOCK, self.count - pos)
+            data = memoryview(os.pread(self.fd, n * RECORD.size, pos * RECORD.size))
+            yield array('i', data.cast('i')[4::6].tobytes())
+
+    def position_at(self, ts, side="left"):
+        """段内插入位置：先在稀疏索引上二分，再在一个块内二分"""
+        bisect = _bisect(side)
+        k = bisect(self._index(), ts)
+        # 目标位置落在第k-1个索引点与第k个索引点之间
+        lo = max(0, (k - 1) * INDEX_STRIDE)
+        hi = min(self.count, k * INDEX_STRIDE)
+        if lo >= hi:
+            return lo
+        data = os.pread(self.fd, (hi - lo) * RECORD.size, lo * RECORD.size)
+        return lo + bisect([ts_ for _, ts_, _ in RECORD.iter_unpack(data)], ts)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PackedSegment:
+    """压缩段：块索引在第一次访问时才读入，最近解压的一块缓存起来（翻页时多半还在同一块）。
+
+    界面线程翻页和后台线程建立名称索引会同时读同一个段：打开文件加锁，块缓存整体替换、读取时先取到局部变量。
+    """
+    packed = True
+
+    def __init__(self, path, first, count, start_ts, end_ts):
+        self.path = path
+        self.first = first
+        self.count = count
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.fd = None
+        self._block_ts = None  # 每块首条的时间戳
+        self._spans = None  # 每块的(偏移, 长度)
+        self._cached = (None, None, None)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.fd is not None:
+            return
+        with self._lock:
+            if self.fd is not None:
+                return
+            fd = os.open(self.path, os.O_RDONLY)
+            size = os.fstat(fd).st_size
+            magic, index_offset, blocks, count = PACK_TRAILER.unpack(
+                os.pread(fd, PACK_TRAILER.size, size - PACK_TRAILER.size))
+            if magic != PACK_MAGIC or count != self.count:
+                os.close(fd)
+                raise ValueError(f"{self.path}已损坏")
+            entries = list(BLOCK_ENTRY.iter_unpack(os.pread(fd, blocks * BLOCK_ENTRY.size, index_offset)))
+            self._block_ts = [first_ts for first_ts, _, _ in entries]
+            self._spans = [(offset, length) for _, offset, length in entries]
+            self.fd = fd  # 最后赋值：其他线程看到fd时块索引已经就绪
+
+    def _block(self, k):
+        cached = self._cached
+        if cached[0] != k:
+            offset, length = self._spans[k]
+            data = zlib.decompress(os.pread(self.fd, length, offset))
+            n = len(data) // 12
+            ts, ids = array('d'), array('i')
+            ts.frombytes(data[:8 * n])
+            ids.frombytes(data[8 * n:])
+            cached = (k, ts, ids)
+            self._cached = cached
+        return cached[1], cached[2]
+
+    def rows(self, start, stop):
+        self._load()
+        k = start // BLOCK_RECORDS
+        while start < stop:
+            ts, ids = self._block(k)
+            base = k * BLOCK_RECORDS
+            end = min(stop, base + len(ts))
+            yield from zip(ts[start - base:end - base], ids[start - base:end - base])
+            start = end
+            k += 1
+
+    def name_id_blocks(self):
+        self._load()
+        for k in range(len(self._spans)):
+            yield self._block(k)[1]
+
+    def position_at(self, ts, side="left"):
+        """段内插入位置：在块索引上二分找到块，再在解压后的块内二分"""
+        self._load()
+        bisect = _bisect(side)
+        k = bisect(self._block_ts, ts)
+        if k == 0:
+            return 0
+        block_ts, _ = self._block(k - 1)
+        return (k - 1) * BLOCK_RECORDS + bisect(block_ts, ts)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def pack_segment(segment, path, cancelled=None):
+    """把未压缩的段写成压缩段文件path；先写临时文件，fsync后再改名。cancelled()为真时抛出InterruptedError"""
+    tmp_path = path + ".tmp"
+    entries = []
+    try:
+        with open(tmp_path, "wb") as f:
+            for pos in range(0, segment.count, BLOCK_RECORDS):
+                if cancelled is not None and cancelled():
+                    raise InterruptedError("压缩已取消")
+                n = min(BLOCK_RECORDS, segment.count - pos)
+                data = memoryview(os.pread(segment.fd, n * RECORD.size, pos * RECORD.size))
+                # 每条24字节：时间戳是第2个double，名称编号是第5个int32
+                ts = data.cast('d')[1::3]
+                block = zlib.compress(ts.tobytes() + data.cast('i')[4::6].tobytes())
+                entries.append(BLOCK_ENTRY.pack(ts[0], f.tell(), len(block)))
+                f.write(block)
+            index_offset = f.tell()
+            f.write(b"".join(entries))
+            f.write(PACK_TRAILER.pack(PACK_MAGIC, index_offset, len(entries), segment.count))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ================= 历史 =================
+class HistoryLog:
+    """中奖历史。挂到DrawEngine.history上后每抽出一件记一条"""
+    def __init__(self, path="draw_history.bin", readonly=False,
+                 segment_records=SEGMENT_RECORDS, segment_seconds=SEGMENT_SECONDS):
+        """readonly=True时只读打开（导出等场合，抽奖程序可能正在另一个进程里追加），不修补、不压缩、不清理文件。
+
+        segment_records、segment_seconds为写入段封存的条数和时间跨度（None为不按时间封存）。
+        """
+        self.path = path
+        self.readonly = readonly
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self._dir = os.path.dirname(path)
+        self._lock = threading.Lock()  # 保护段列表的替换和清单写入（后台压缩线程也会改）
+        self._compactor = None
+        self._closing = False
+        self._retired = []  # 已被压缩段替换的未压缩段，关闭时删除
+        if readonly:
+            self._names_fd = os.open(names_path_for(path), os.O_RDONLY)
+        else:
+            self._names_fd = os.open(names_path_for(path), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        with open(names_path_for(path), "rb") as f:
+            raw = f.read()
+        complete = raw.rfind(b"\n") + 1
+        if complete < len(raw) and not readonly:
+            # 截掉崩溃时没写完的最后一行
+            os.ftruncate(self._names_fd, complete)
+        self._names = raw[:complete].decode("utf-8").split("\n")[:-1]
+        self._name_ids = {name: i for i, name in enumerate(self._names)}
+        self._postings = None  # 名称索引：名称编号 -> 位置array（升序），第一次搜索时建立
+        self._sorted_names = None  # [(名称, 名称编号)]按名称排序，前缀查找用
+        self._warming = None  # warm_index启动的后台扫描
+
+        entries = self._read_manifest()
+        adopted = entries is None
+        if adopted:
+            # 还没有清单：接管旧版本的单个历史文件，或者全新开始
+            name = os.path.basename(path) if os.path.exists(path) else self._segment_name(0)
+            entries = [{"file": name, "first": 0}]
+        segments = []
+        for entry in entries[:-1]:
+            if entry.get("packed"):
+                segments.append(PackedSegment(self._join(entry["file"]), entry["first"], entry["count"],
+                                              entry["start_ts"], entry["end_ts"]))
+            else:
+                segments.append(RawSegment(self._join(entry["file"]), entry["first"]))
+        segments.append(RawSegment(self._join(entries[-1]["file"]), entries[-1]["first"], readonly))
+        self._segments = segments  # 只整体替换，不原地修改，读取时不必加锁
+        self._last_ts = next((s.end_ts for s in reversed(segments) if s.count), 0.0)
+        if not readonly:
+            if adopted:
+                self._write_manifest()
+            self._remove_orphans()
+            self._start_compaction()
+
+    # ================= 清单 =================
+    def _join(self, name):
+        return os.path.join(self._dir, name)
+
+    def _segment_name(self, first):
+        return f"{os.path.basename(self.path)}.{first:012d}"
+
+    def _read_manifest(self):
+        try:
+            with open(manifest_path_for(self.path), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or not manifest.get("segments"):
+            raise ValueError(f"{manifest_path_for(self.path)}不是中奖历史清单")
+        return manifest["segments"]
+
+    def _write_manifest(self):
+        """按当前段列表写清单（先写临时文件再改名），调用方持有self._lock或尚无其他线程"""
+        entries = []
+        for segment in self._segments:
+            entry = {"file": os.path.basename(segment.path), "first": segment.first}
+            if segment is not self._segments[-1]:
+                entry.update(count=segment.count, start_ts=segment.start_ts, end_ts=segment.end_ts)
+                if segment.packed:
+                    entry["packed"] = True
+            entries.append(entry)
+        manifest_path = manifest_path_for(self.path)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "segments": entries}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _remove_orphans(self):
+        """删掉清单里没有的段文件：崩溃前没来得及登记的新段、压缩到一半的临时文件、已被替换的未压缩段"""
+        prefix = os.path.basename(self.path) + "."
+        referenced = {os.path.basename(s.path) for s in self._segments}
+        for name in os.listdir(self._dir or "."):
+            if name in referenced:
+                continue
+            stem = name[len(prefix):].split(".", 1)[0] if name.startswith(prefix) else None
+            # 旧版本的单个历史文件被接管、压缩之后也不再登记
+            if name == os.path.basename(self.path) or stem is not None and len(stem) == 12 and stem.isdigit():
+                try:
+                    os.remove(self._join(name))
+                except OSError:
+                    pass
+
+    # ================= 写入 =================
+    def __len__(self):
+        active = self._segments[-1]
+        return active.first + active.count
+
+    def _name_id(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            os.write(self._names_fd, (name + "\n").encode("utf-8"))
+            self._names.append(name)
+            self._name_ids[name] = name_id
+            self._sorted_names = None
+            if self._postings is not None:
+                self._postings.append(array('q'))
+        return name_id
+
+    def append(self, names, ts=None):
+        """追加若干条中奖记录（同一时刻），返回第一条的序号。写入段写满时中途封存换段"""
+        ts = time.time() if ts is None else ts
+        # 系统时间被往回调时沿用上一条的时间，保证时间戳单调、索引可二分
+        ts = max(ts, self._last_ts)
+        first_seq = len(self) + 1
+        name_ids = [self._name_id(name) for name in names]
+        done = 0
+        while done < len(name_ids):
+            active = self._segments[-1]
+            if active.count and (active.count >= self.segment_records or
+                                 self.segment_seconds is not None and ts - active.start_ts >= self.segment_seconds):
+                active = self._rotate()
+            n = min(len(name_ids) - done, self.segment_records - active.count)
+            seq = active.first + active.count + 1
+            chunk = b"".join(RECORD.pack(seq + i, ts, name_ids[done + i]) for i in range(n))
+            active.append(chunk, n, ts)
+            if self._postings is not None:
+                for pos, name_id in enumerate(name_ids[done:done + n], seq - 1):
+                    self._postings[name_id].append(pos)
+            done += n
+        if name_ids:
+            self._last_ts = ts
+        return first_seq
+
+    def record(self, inventory, indices):
+        """DrawEngine的记录接口：按下标取名称追加"""
+        self.append([inventory.name(i) for i in indices])
+
+    def _rotate(self):
+        """封存写入段、新开一段并登记到清单，封存的段交给后台线程压缩"""
+        sealed = self._segments[-1]
+        first = sealed.first + sealed.count
+        active = RawSegment(self._join(self._segment_name(first)), first, readonly=False)
+        with self._lock:
+            self._segments = self._segments + [active]
+            self._write_manifest()
+        self._start_compaction()
+        return active
+
+    # ================= 压缩 =================
+    def _start_compaction(self):
+        with self._lock:
+            if self._compactor is not None or self._closing:
+                return
+            if all(s.packed for s in self._segments[:-1]):
+                return
+            self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+            self._compactor.start()
+
+    def _compact_loop(self):
+        while True:
+            with self._lock:
+                pending = [s for s in self._segments[:-1] if not s.packed]
+                if not pending or self._closing:
+                    self._compactor = None
+                    return
+            try:
+                self.compact(pending[0])
+            except (OSError, ValueError, InterruptedError):
+                # 压缩失败（如磁盘满）不影响记录，未压缩的段照常可读，下次启动再压缩
+                with self._lock:
+                    self._compactor = None
+                return
+
+    def compact(self, segment):
+        """把一个已封存的未压缩段压缩，替换清单中的记录；原文件在关闭时删除"""
+        path = self._join(self._segment_name(segment.first) + ".z")
+        pack_segment(segment, path, lambda: self._closing)
+        packed = PackedSegment(path, segment.first, segment.count, segment.start_ts, segment.end_ts)
+        with self._lock:
+            self._segments = [packed if s is segment else s for s in self._segments]
+            self._write_manifest()
+            self._retired.append(segment)
+
+    # ================= 查询 =================
+    def read(self, start, stop):
+        """第start到stop-1条记录（从0计），返回[(序号, 时间戳, 名称), ...]"""
+        return list(self.iter(start, stop))
+
+    def iter(self, start=0, stop=None):
+        """按位置顺序产出(序号, 时间戳, 名称)，逐段分块读取，内存占用与总条数无关。
+
+        名称表先于记录写入，正常不会缺；万一缺了（名称表被删改）名称显示为空。
+        """
+        segments = self._segments
+        total = len(self)
+        stop = total if stop is None else min(stop, total)
+        names = self._names
+        n_names = len(names)
+        pos = max(0, start)
+        k = bisect_right([s.first for s in segments], pos) - 1
+        while pos < stop:
+            segment = segments[k]
+            end = min(stop, segment.first + segment.count)
+            seq = pos + 1
+            for ts, name_id in segment.rows(pos - segment.first, end - segment.first):
+                yield seq, ts, names[name_id] if name_id < n_names else ""
+                seq += 1
+            pos = end
+            k += 1
+
+    def read_recent(self, offset, limit):
+        """从最新一条往前数，跳过offset条后的limit条，新的在前（分页显示用）"""
+        stop = max(0, len(self) - offset)
+        rows = self.read(max(0, stop - limit), stop)
+        rows.reverse()
+        return rows
+
+    def position_at(self, ts, side="left"):
+        """时间戳ts在记录中的插入位置：按各段的结束时间找到所在段，只在这一段内查找"""
+        segments = [s for s in self._segments if s.count]
+        # 第一个结束时间>=ts（left）或>ts（right）的段，之前的段整段都在ts之前
+        k = _bisect(side)([s.end_ts for s in segments], ts)
+        if k == len(segments):
+            return len(self)
+        return segments[k].first + segments[k].position_at(ts, side)
+
+    def range_positions(self, start_ts=None, end_ts=None):
+        """时间段[start_ts, end_ts)对应的位置区间(start, stop)，None表示不限"""
+        start = 0 if start_ts is None else self.position_at(start_ts)
+        stop = len(self) if end_ts is None else self.position_at(end_ts)
+        return start, max(start, stop)
+
+    def iter_range(self, start_ts=None, end_ts=None):
+        """按时间段产出记录，只读取该时间段覆盖的段和块"""
+        start, stop = self.range_positions(start_ts, end_ts)
+        return self.iter(start, stop)
+
+    # ================= 搜索 =================
+    def scan_names(self, stop):
+        """扫描前stop条记录的名称编号，返回名称编号 -> 位置array（升序）。只读已写入的记录，可在后台线程里调用"""
+        n_names = len(self._names)
+        postings = [array('q') for _ in range(n_names)]
+        appenders = [positions.append for positions in postings]
+        pos = 0
+        for segment in self._segments:
+            if pos >= stop:
+                break
+            for ids in segment.name_id_blocks():
+                if self._closing:
+                    return postings  # 正在关闭，结果不会再用
+                ids = ids[:stop - pos]
+                if max(ids) < n_names:
+                    for offset, name_id in enumerate(ids, pos):
+                        appenders[name_id](offset)
+                else:
+                    # 名称表被删改过：缺名称的记录不进索引
+                    for offset, name_id in enumerate(ids, pos):
+                        if name_id < n_names:
+                            appenders[name_id](offset)
+                pos += len(ids)
+                if pos >= stop:
+                    break
+        return postings
+
+    def warm_index(self):
+        """在后台线程里预先建立名称索引（启动后调用），第一次搜索时就不必等扫描"""
+        if self._postings is None and self._warming is None:
+            stop = len(self)
+            job = {"stop": stop}
+            job["thread"] = threading.Thread(target=lambda: job.update(postings=self.scan_names(stop)), daemon=True)
+            job["thread"].start()
+            self._warming = job
+
+    def _name_positions(self):
+        """名称索引：名称编号 -> 位置array。没有预先建立时当场扫描；建好后补上扫描之后追加的记录，之后随追加更新"""
+        if self._postings is None:
+            job, self._warming = self._warming, None
+            if job is not None:
+                job["thread"].join()
+            postings = job.get("postings") if job is not None else None
+            stop = job["stop"] if postings is not None else len(self)
+            if postings is None:
+                postings = self.scan_names(stop)
+            postings.extend(array('q') for _ in range(len(self._names) - len(postings)))
+            for pos, (_, _, name) in enumerate(self.iter(stop), stop):
+                name_id = self._name_ids.get(name)
+                if name_id is not None:
+                    postings[name_id].append(pos)
+            self._postings = postings
+        return self._postings
+
+    def names_with_prefix(self, prefix):
+        """名称以prefix开头的名称编号（prefix为空时为全部名称）"""
+        if self._sorted_names is None:
+            self._sorted_names = sorted((name, i) for i, name in enumerate(self._names))
+        names = self._sorted_names
+        ids = []
+        for k in range(bisect_left(names, (prefix,)), len(names)):
+            if not names[k][0].startswith(prefix):
+                break
+            ids.append(names[k][1])
+        return ids
+
+    def search(self, prefix, start_ts=None, end_ts=None, limit=SEARCH_LIMIT):
+        """按奖品名称前缀和时间段[start_ts, end_ts)查找，返回(匹配总数, 最新的limit条[(序号, 时间戳, 名称), ...])。
+
+        各名称的位置升序排列，时间段换算成位置区间后在每个名称上二分，只取各自最后limit条合并。
+        """
+        start, stop = self.range_positions(start_ts, end_ts)
+        postings = self._name_positions()
+        name_ids = self.names_with_prefix(prefix)
+        spans = []
+        total = merge_cost = 0
+        for name_id in name_ids:
+            positions = postings[name_id]
+            lo = bisect_left(positions, start)
+            hi = bisect_left(positions, stop)
+            if hi > lo:
+                spans.append((positions, lo, hi))
+                total += hi - lo
+                merge_cost += min(limit, hi - lo)
+        if not total:
+            return 0, []
+        if limit * (stop - start) // total < merge_cost:
+            # 匹配的记录很密（如前缀很短）：从stop往前顺序读，比合并各名称的位置更快
+            names = {self._names[name_id] for name_id in name_ids}
+            rows = []
+            while stop > start and len(rows) < limit:
+                page = self.read(max(start, stop - READ_BLOCK), stop)
+                rows.extend(row for row in reversed(page) if row[2] in names)
+                stop -= len(page)
+            return total, rows[:limit]
+        candidates = []
+        for positions, lo, hi in spans:
+            candidates.extend(positions[max(lo, hi - limit):hi])
+        candidates.sort(reverse=True)
+        return total, [self.read(pos, pos + 1)[0] for pos in candidates[:limit]]
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        if self._warming is not None:
+            self._warming["thread"].join()
+        for segment in self._segments:
+            segment.close()
+        for segment in self._retired:
+            segment.close()
+            try:
+                os.remove(segment.path)
+            except OSError:
+                pass  # 下次启动时按孤儿文件清理
+        os.close(self._names_fd)
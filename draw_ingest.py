@@ -0,0 +1,144 @@
+"""大奖品表并行解析：把CSV按换行对齐切成若干字节区间，各进程分别解析后按文件顺序合并
+
+    python draw_ingest.py prizes.csv -j 8        # 并行解析并重建快照，之后程序启动直接映射快照
+
+每个区间在子进程中解析成紧凑的名称串与数量数组，只把这几段字节传回主进程；
+错误行号在子进程中按区间内的相对行号记录，合并时换算成文件中的实际行号。
+注意：按字节切分要求名称中不含换行（带引号的多行字段会被切断），奖品表一般不会这样写。
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from draw_engine import (BATCH_SIZE, LoadErrors, PrizeInventory, detect_compression, iter_prize_batches,
+                         load_prizes, prize_columns)
+
+# 小于此大小的文件直接单进程解析，进程启动和传输的开销不划算
+PARALLEL_MIN_BYTES = 8 << 20
+# 每个进程分到的区间数，区间切得细一些可以减少尾部等待
+RANGES_PER_WORKER = 4
+
+
+# ================= 切分 =================
+def read_header(f):
+    """读到表头行为止（跳过前面的空行和注释），返回(列位置, 表头之后的字节偏移, 表头所在行号)"""
+    line_num = 0
+    for line in iter(f.readline, b""):
+        line_num += 1
+        text = line.decode("utf-8")
+        if text.strip() and not text.startswith('#'):
+            return prize_columns(next(csv.reader([text]))), f.tell(), line_num
+    raise ValueError("CSV文件必须包含name和quantity两列")
+
+
+def split_ranges(f, start, end, parts):
+    """把[start, end)切成至多parts段，每段的起点都在换行之后"""
+    bounds = [start]
+    step = max(1, (end - start) // parts)
+    for i in range(1, parts):
+        pos = max(start + i * step, bounds[-1])
+        if pos >= end:
+            break
+        f.seek(pos - 1)
+        f.readline()  # 落在行中间时跳到下一行开头；恰好在行首时readline只读掉前一个换行
+        pos = f.tell()
+        if pos >= end:
+            break
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+# ================= 子进程 =================
+class RangeErrors(LoadErrors):
+    """区间内的错误：先记下(相对行号, 信息)，由主进程换算行号后再格式化"""
+    def add(self, line_num, message):
+        self.count += 1
+        if len(self.samples) < self.limit:
+            self.samples.append((line_num, message))
+
+
+def parse_range(task):
+    """解析一个字节区间，返回(名称串, 结束偏移数组, 数量数组, 区间行数, RangeErrors)"""
+    path, start, end, columns, error_limit = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    errors = RangeErrors(error_limit)
+    names = bytearray()
+    ends = array('q')
+    quantities = array('q')
+    text = io.StringIO(data.decode("utf-8"), newline="")
+    for batch in iter_prize_batches(text, BATCH_SIZE, errors, columns):
+        for name, quantity in batch:
+            names += name.encode("utf-8")
+            ends.append(len(names))
+            quantities.append(quantity)
+    return bytes(names), ends, quantities, data.count(b"\n"), errors
+
+
+# ================= 合并 =================
+def load_prizes_parallel(path="prizes.csv", workers=None, error_limit=100, min_bytes=PARALLEL_MIN_BYTES):
+    """并行解析奖品CSV，结果与load_prizes完全一致，返回(库存, LoadErrors)"""
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    if workers == 1 or size < min_bytes:
+        return load_prizes(path, error_limit=error_limit)
+
+    with open(path, "rb") as f:
+        if detect_compression(f) is not None:
+            # 压缩流无法按字节区间随机定位，只能顺序解压
+            return load_prizes(path, error_limit=error_limit)
+        columns, data_start, header_line = read_header(f)
+        ranges = split_ranges(f, data_start, size, workers * RANGES_PER_WORKER)
+    tasks = [(path, start, end, columns, error_limit) for start, end in ranges]
+
+    inventory = PrizeInventory()
+    errors = LoadErrors(error_limit)
+    line_base = header_line
+    with ProcessPoolExecutor(workers) as pool:
+        # map按提交顺序返回，合并顺序即文件顺序
+        for names, ends, quantities, line_count, part_errors in pool.map(parse_range, tasks):
+            inventory.extend_columns(names, ends, quantities)
+            for line_num, message in part_errors.samples:
+                errors.add(line_base + line_num, message)
+            errors.count += part_errors.count - len(part_errors.samples)
+            line_base += line_count
+    return inventory, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行解析奖品表并重建快照")
+    parser.add_argument("catalogue", nargs="?", default="prizes.csv", help="奖品表CSV")
+    parser.add_argument("-j", "--workers", type=int, help="进程数，默认CPU核数")
+    parser.add_argument("--no-snapshot", action="store_true", help="只解析计时，不写快照")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    st = os.stat(args.catalogue)
+    inventory, errors = load_prizes_parallel(args.catalogue, args.workers, min_bytes=0)
+    elapsed = time.perf_counter() - start
+    print(f"解析完成：{len(inventory)}种奖品，共{inventory.total}件，用时{elapsed:.2f}秒")
+    if errors:
+        print(f"奖品表有{len(errors)}处错误，已跳过对应行：", file=sys.stderr)
+        for message in errors[:10]:
+            print(f"  {message}", file=sys.stderr)
+    if not args.no_snapshot:
+        from draw_snapshot import save_snapshot, snapshot_path_for
+        snapshot_path = snapshot_path_for(args.catalogue)
+        if save_snapshot(snapshot_path, inventory, errors, st, args.catalogue):
+            print(f"已写入快照{snapshot_path}")
+        else:
+            print("奖品表在解析期间被修改或快照无法写入，未生成快照", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
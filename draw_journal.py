@@ -0,0 +1,299 @@
+"""库存扣减日志：每抽出一件就把奖品下标追加到日志，程序崩溃后重启按日志恢复剩余数量
+
+文件布局（小端）：
+    <日志>             HEADER（magic、版本、奖品表内容的SHA-1） + int64[...]：每条为一件被抽走的奖品下标，
+                       批量抽奖按件逐条写入
+    <日志>.names       首行"#奖品表SHA-1"，之后是日志中出现过的下标对应的名称（"下标\\t名称"每行一条），
+                       只在奖品表内容变了、下标对不上时按名称恢复
+    <日志>.checkpoint  CHECKPOINT头（奖品表SHA-1、覆盖到的日志偏移） + int64[(下标, 件数)...]：
+                       定期写入的累计扣减，恢复时只需再统计它之后的记录
+
+日志本身从不截短（除了改写），检查点只是它前一段的汇总：SHA-1与日志头不一致的检查点直接忽略、
+从头统计，结果不变；名称文件的SHA-1与日志头不一致时视为过期。
+
+写入走操作系统缓存，进程崩溃不会丢失；落盘由后台线程合并提交：距上次fsync满interval秒后
+一次fsync覆盖这段时间内的全部记录，抽奖再快每秒也只有几次fsync，断电最多丢最近interval秒。
+"""
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import Counter
+
+MAGIC = b"DRAWJNL1"
+CHECKPOINT_MAGIC = b"DRAWJCP2"
+VERSION = 1
+HEADER = struct.Struct("<8sI20s")
+# magic, 奖品表SHA-1, 覆盖到的日志偏移, (下标, 件数)对数
+CHECKPOINT = struct.Struct("<8s20s4xqq")
+RECORD_SIZE = 8  # 一条记录是一个int64下标
+GROUP_COMMIT_INTERVAL = 0.1
+# 每追加这么多条记录写一次检查点，恢复时需要逐条统计的记录不超过这个数
+CHECKPOINT_RECORDS = 1 << 16
+
+
+def journal_path_for(csv_path):
+    return csv_path + ".journal"
+
+
+def _write_atomic(path, chunks):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ================= 检查点与读取 =================
+def write_checkpoint(path, offset, counts, digest):
+    pairs = array('q')
+    for index, count in counts.items():
+        pairs.append(index)
+        pairs.append(count)
+    _write_atomic(path + ".checkpoint",
+                  (CHECKPOINT.pack(CHECKPOINT_MAGIC, digest, offset, len(counts)), pairs.tobytes()))
+
+
+def read_checkpoint(path, digest):
+    """返回(覆盖到的日志偏移, 累计扣减Counter)。
+
+    没有检查点、旧格式的检查点、或者检查点的奖品表SHA-1不是digest（改写日志时在替换日志头之前崩溃）时，
+    偏移为日志头之后，即从头统计。
+    """
+    try:
+        with open(path + ".checkpoint", "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return HEADER.size, Counter()
+    if len(raw) < CHECKPOINT.size or raw[:8] != CHECKPOINT_MAGIC:
+        return HEADER.size, Counter()
+    magic, checkpoint_digest, offset, pair_count = CHECKPOINT.unpack_from(raw, 0)
+    if len(raw) != CHECKPOINT.size + 16 * pair_count:
+        raise ValueError(f"{path}.checkpoint已损坏")
+    if checkpoint_digest != digest:
+        return HEADER.size, Counter()
+    pairs = array('q')
+    pairs.frombytes(memoryview(raw)[CHECKPOINT.size:])
+    return offset, Counter(dict(zip(pairs[0::2], pairs[1::2])))
+
+
+def read_journal(path):
+    """读取已有日志，返回(奖品表SHA-1, 各下标被抽走的件数Counter)；文件不存在时返回(None, 空Counter)。
+
+    检查点之前的部分直接取检查点里的累计值，只统计之后的记录；末尾不完整的记录（写到一半时崩溃）忽略。
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None, Counter()
+    with f:
+        raw = f.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            return None, Counter()
+        magic, version, digest = HEADER.unpack(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}不是抽奖扣减日志")
+        offset, counts = read_checkpoint(path, digest)
+        f.seek(offset)
+        tail = f.read()
+    records = array('q')
+    records.frombytes(memoryview(tail)[:len(tail) // RECORD_SIZE * RECORD_SIZE])
+    counts.update(records)
+    return digest, counts
+
+
+def names_header(digest):
+    return f"#{digest.hex()}\n"
+
+
+def read_names(path, digest):
+    """读取旁路名称文件，返回{下标: 名称}；文件记录的奖品表SHA-1不是digest（已过期）时返回None。
+
+    没有首行SHA-1的旧文件视为与日志一致。
+    """
+    names = {}
+    try:
+        with open(path + ".names", "r", encoding="utf-8", newline="\n") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # 崩溃时没写完的最后一行
+                if line.startswith("#"):
+                    if line != names_header(digest):
+                        return None
+                    continue
+                index, name = line[:-1].split("\t", 1)
+                names[int(index)] = name
+    except FileNotFoundError:
+        pass
+    return names
+
+
+def write_names(path, inventory, digest, indices):
+    """按当前奖品表重写名称文件，只含indices"""
+    lines = "".join(f"{i}\t{inventory.name(i)}\n" for i in indices)
+    _write_atomic(path + ".names", ((names_header(digest) + lines).encode("utf-8"),))
+
+
+# ================= 写入 =================
+class DrawJournal:
+    """追加写的扣减日志，挂到DrawEngine.journal上后每次扣减库存都会记录。
+
+    counts为日志开头至今各下标的累计件数（打开时由open_journal传入），随记录更新，用于写检查点。
+    """
+    def __init__(self, path, digest, counts=None, interval=GROUP_COMMIT_INTERVAL):
+        self.path = path
+        self.digest = digest
+        self.interval = interval
+        self.counts = Counter(counts or ())
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._names_fd = os.open(path + ".names", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < HEADER.size:
+            # 新日志：清掉可能残留的旁路文件
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._names_fd, 0)
+            if os.path.exists(path + ".checkpoint"):
+                os.remove(path + ".checkpoint")
+            os.write(self._fd, HEADER.pack(MAGIC, VERSION, digest))
+            os.write(self._names_fd, names_header(digest).encode("utf-8"))
+            os.fsync(self._fd)
+            size = HEADER.size
+        elif (size - HEADER.size) % RECORD_SIZE:
+            # 截掉崩溃时写了一半的记录，之后的追加才能保持对齐
+            size -= (size - HEADER.size) % RECORD_SIZE
+            os.ftruncate(self._fd, size)
+        self._size = size
+        self._checkpoint_at = read_checkpoint(path, digest)[0]
+        known = read_names(path, digest)
+        if known is None:
+            # 名称文件已过期：清空重记（open_journal会先按奖品表补写，正常走不到这里）
+            os.ftruncate(self._names_fd, 0)
+            os.write(self._names_fd, names_header(digest).encode("utf-8"))
+            known = {}
+        self._known = set(known)
+        self._dirty = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def record(self, inventory, indices):
+        """记录抽走的若干件（同一下标可重复出现）"""
+        if not indices:
+            return
+        new_names = [i for i in set(indices) if i not in self._known]
+        if new_names:
+            self._known.update(new_names)
+            lines = "".join(f"{i}\t{inventory.name(i)}\n" for i in new_names)
+            os.write(self._names_fd, lines.encode("utf-8"))
+        data = array('q', indices).tobytes()
+        os.write(self._fd, data)
+        with self._cond:
+            self.counts.update(indices)
+            self._size += len(data)
+            if not self._dirty:
+                self._dirty = True
+                self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # 攒够一个提交间隔再fsync，这段时间内的记录共用一次落盘
+            time.sleep(self.interval)
+            self.sync()
+
+    def sync(self):
+        """立即落盘（名称文件先于记录，恢复时记录引用的名称一定已经存在），记录攒够时顺带写检查点"""
+        with self._cond:
+            self._dirty = False
+            size = self._size
+            due = size - self._checkpoint_at >= CHECKPOINT_RECORDS * RECORD_SIZE
+            counts = self.counts.copy() if due else None
+        os.fsync(self._names_fd)
+        os.fsync(self._fd)
+        if counts is not None:
+            write_checkpoint(self.path, size, counts, self.digest)
+            self._checkpoint_at = size
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.sync()
+        os.close(self._fd)
+        os.close(self._names_fd)
+
+
+# ================= 恢复 =================
+def remap_by_name(inventory, counts, names):
+    """奖品表改过之后：把日志下标经由名称换成当前奖品表的下标，返回(新的计数, 找不到的件数)"""
+    index_of = {}
+    for i, (name, _) in enumerate(inventory.items()):
+        index_of.setdefault(name, i)
+    remapped = Counter()
+    missing = 0
+    for index, count in counts.items():
+        target = index_of.get(names.get(index))
+        if target is None:
+            missing += count
+        else:
+            remapped[target] += count
+    return remapped, missing
+
+
+def restore(engine, counts):
+    """按计数扣减engine的库存，返回(各下标实际扣减的件数Counter, 超出现有数量而未扣减的件数)"""
+    inventory = engine.inventory
+    n = len(inventory)
+    taken_counts = Counter()
+    excess = 0
+    for index, count in counts.items():
+        taken = min(count, inventory.quantity(index)) if 0 <= index < n else 0
+        if taken:
+            taken_counts[index] = taken
+        excess += count - taken
+    inventory.subtract_counts(taken_counts)
+    engine.reset_tickets()
+    return taken_counts, excess
+
+
+def _rewrite(path, inventory, digest, counts):
+    """按当前奖品表的下标重写日志（奖品表内容变了之后）：累计值全部放进检查点，日志只剩头部。
+
+    替换日志头是提交点：之前崩溃，新检查点的SHA-1与旧日志对不上而被忽略，旧日志和旧名称文件都还完整；
+    之后崩溃，名称文件的SHA-1与新日志对不上，open_journal按奖品表补写。
+    """
+    write_checkpoint(path, HEADER.size, counts, digest)
+    _write_atomic(path, (HEADER.pack(MAGIC, VERSION, digest),))
+    write_names(path, inventory, digest, counts)
+
+
+def open_journal(engine, path, digest, interval=GROUP_COMMIT_INTERVAL):
+    """恢复已有日志并继续追加，返回(DrawJournal, 恢复的件数, 对不上的件数)。
+
+    engine应刚从奖品表加载完；digest为当前奖品表内容的SHA-1。与日志记录的不一致时
+    按名称恢复（已删除的奖品计入对不上的件数）并改写日志，之后的记录都以当前奖品表的下标为准。
+    """
+    logged_digest, counts = read_journal(path)
+    missing = 0
+    if logged_digest is not None and logged_digest != digest:
+        counts, missing = remap_by_name(engine.inventory, counts, read_names(path, logged_digest) or {})
+        taken, excess = restore(engine, counts)
+        counts = taken
+        _rewrite(path, engine.inventory, digest, counts)
+    else:
+        taken, excess = restore(engine, counts)
+        if logged_digest is not None and read_names(path, digest) is None:
+            # 上次改写日志时替换完日志头、还没写名称文件就崩溃了：下标已是当前奖品表的
+            write_names(path, engine.inventory, digest, counts)
+    journal = DrawJournal(path, digest, counts, interval)
+    engine.journal = journal
+    return journal, sum(taken.values()), missing + excess
@@ -0,0 +1,160 @@
+"""可回放的抽奖会话：记录每次抽奖结果与随机数位置，并能对照奖品表快速核验"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+
+from draw_engine import DrawEngine, load_prizes
+
+SESSION_MAGIC = "#draw-session"
+
+
+def catalogue_digest(inventory):
+    """奖品表指纹：名称与初始数量的SHA-1"""
+    h = hashlib.sha1()
+    for name, quantity in inventory.items():
+        h.update(f"{name}\t{quantity}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ================= 会话日志 =================
+class SessionLog:
+    """文本会话日志。
+
+    首行为 "#draw-session {json头}"，之后每行一条记录（制表符分隔）：
+        d  序号  随机数位置  奖品下标(-1为已抽完)  奖品名称
+        b  序号  随机数位置  k  逗号分隔的下标列表
+        r  序号  随机数位置  0  热加载改动的JSON（新增行与各下标的数量变化）
+    """
+    def __init__(self, f, seq=0):
+        self.f = f
+        self.seq = seq
+
+    @classmethod
+    def create(cls, path, engine, catalogue="prizes.csv"):
+        """为刚加载完奖品的引擎新建会话日志"""
+        if engine.seed is None or engine.position is None:
+            raise ValueError("会话模式需要指定随机数种子")
+        header = {
+            "seed": engine.seed,
+            "mode": engine.mode,
+            "catalogue": catalogue,
+            "prizes": len(engine.inventory),
+            "units": engine.inventory.total,
+            "digest": catalogue_digest(engine.inventory),
+            "position": engine.position,
+            "created": time.time(),
+        }
+        f = open(path, "w", encoding="utf-8")
+        f.write(f"{SESSION_MAGIC} {json.dumps(header, ensure_ascii=False)}\n")
+        f.flush()
+        return cls(f)
+
+    def record_draw(self, position, index, name):
+        self.seq += 1
+        if index is None:
+            self.f.write(f"d\t{self.seq}\t{position}\t-1\t\n")
+        else:
+            self.f.write(f"d\t{self.seq}\t{position}\t{index}\t{name}\n")
+        self.f.flush()
+
+    def record_batch(self, position, k, winners):
+        self.seq += 1
+        self.f.write(f"b\t{self.seq}\t{position}\t{k}\t{','.join(map(str, winners))}\n")
+        self.f.flush()
+
+    def record_reload(self, position, added, deltas):
+        self.seq += 1
+        detail = json.dumps({"added": added, "deltas": deltas}, ensure_ascii=False)
+        self.f.write(f"r\t{self.seq}\t{position}\t0\t{detail}\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def read_header(f):
+    line = f.readline()
+    if not line.startswith(SESSION_MAGIC):
+        raise ValueError("不是抽奖会话日志")
+    return json.loads(line[len(SESSION_MAGIC):])
+
+
+# ================= 回放核验 =================
+class Divergence:
+    """回放中第一处不一致"""
+    def __init__(self, seq, line_num, reason, expected, actual):
+        self.seq = seq
+        self.line_num = line_num
+        self.reason = reason
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return f"第{self.seq}次抽奖（日志第{self.line_num}行）{self.reason}：记录为{self.expected}，回放为{self.actual}"
+
+
+def verify_session(log_path, catalogue=None):
+    """按种子回放会话日志，返回(核验的记录数, 第一处Divergence或None)"""
+    with open(log_path, "r", encoding="utf-8") as f:
+        header = read_header(f)
+        inventory, _ = load_prizes(catalogue or header["catalogue"])
+        engine = DrawEngine(mode=header["mode"], seed=header["seed"])
+        engine.inventory = inventory
+        engine.reset_tickets()
+
+        digest = catalogue_digest(inventory)
+        if digest != header["digest"]:
+            return 0, Divergence(0, 1, "奖品表不一致", header["digest"], digest)
+        if engine.position != header["position"]:
+            return 0, Divergence(0, 1, "初始随机数位置不一致", header["position"], engine.position)
+
+        count = 0
+        for line_num, line in enumerate(f, start=2):
+            kind, seq, position, value, detail = line.rstrip("\n").split("\t", 4)
+            seq = int(seq)
+            if int(position) != engine.position:
+                return count, Divergence(seq, line_num, "随机数位置不一致", int(position), engine.position)
+            if kind == "d":
+                index = engine.draw_index()
+                actual = -1 if index is None else index
+                if actual != int(value):
+                    return count, Divergence(seq, line_num, "抽中奖品不一致", int(value), actual)
+            elif kind == "b":
+                winners = engine.draw_many_indices(int(value))
+                engine.inventory.take(winners)
+                expected = [int(i) for i in detail.split(",")] if detail else []
+                if winners != expected:
+                    at = next((i for i, (a, b) in enumerate(zip(expected, winners)) if a != b),
+                              min(len(expected), len(winners)))
+                    return count, Divergence(seq, line_num, f"批量结果第{at + 1}件不一致",
+                                             expected[at] if at < len(expected) else None,
+                                             winners[at] if at < len(winners) else None)
+            elif kind == "r":
+                reload = json.loads(detail)
+                engine.apply_reload(reload["added"], reload["deltas"])
+            else:
+                return count, Divergence(seq, line_num, "未知记录类型", "d/b/r", kind)
+            count += 1
+    return count, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽奖会话核验")
+    parser.add_argument("log", help="会话日志文件")
+    parser.add_argument("--catalogue", help="奖品表，默认使用日志头中记录的路径")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count, divergence = verify_session(args.log, args.catalogue)
+    elapsed = time.perf_counter() - start
+    if divergence is None:
+        print(f"核验通过：{count}条记录，用时{elapsed:.2f}秒")
+        return 0
+    print(f"核验失败：{divergence}（已通过{count}条，用时{elapsed:.2f}秒）")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
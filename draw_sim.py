@@ -0,0 +1,187 @@
+"""活动蒙特卡洛模拟：用候选奖品表模拟大量完整活动，统计各奖品抽完的时间和空抽情况"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from draw_engine import DrawEngine, load_prizes
+from draw_ingest import load_prizes_parallel
+
+
+# ================= 单进程模拟 =================
+def simulate_events(inventory, events, draws, mode="weighted", seed=None):
+    """模拟events场活动，每场抽draws次，返回可累加的统计结果"""
+    n = len(inventory)
+    exhausted = [0] * n      # 抽完的场次数
+    at_sum = [0] * n         # 抽完时的抽奖序号之和
+    at_sq_sum = [0] * n
+    at_min = [0] * n
+    at_max = [0] * n
+    empty_events = 0
+    empty_draws = 0
+    first_empty_sum = 0
+
+    rng = random.Random(seed)
+    engine = DrawEngine(rng=rng, mode=mode)
+    for _ in range(events):
+        engine.inventory = inventory.copy()
+        engine.reset_tickets()
+        quantities = engine.inventory.quantities
+        draw_index = engine.draw_index
+        for d in range(1, draws + 1):
+            index = draw_index()
+            if index is None:
+                empty_events += 1
+                empty_draws += draws - d + 1
+                first_empty_sum += d
+                break
+            if quantities[index] == 0:
+                exhausted[index] += 1
+                at_sum[index] += d
+                at_sq_sum[index] += d * d
+                if not at_min[index] or d < at_min[index]:
+                    at_min[index] = d
+                if d > at_max[index]:
+                    at_max[index] = d
+
+    return {
+        "events": events,
+        "exhausted": exhausted,
+        "at_sum": at_sum,
+        "at_sq_sum": at_sq_sum,
+        "at_min": at_min,
+        "at_max": at_max,
+        "empty_events": empty_events,
+        "empty_draws": empty_draws,
+        "first_empty_sum": first_empty_sum,
+    }
+
+
+def merge_results(total, part):
+    if total is None:
+        return part
+    for key in ("events", "empty_events", "empty_draws", "first_empty_sum"):
+        total[key] += part[key]
+    for key in ("exhausted", "at_sum", "at_sq_sum"):
+        total[key] = [a + b for a, b in zip(total[key], part[key])]
+    total["at_min"] = [b if not a or (b and b < a) else a for a, b in zip(total["at_min"], part["at_min"])]
+    total["at_max"] = [max(a, b) for a, b in zip(total["at_max"], part["at_max"])]
+    return total
+
+
+_worker_inventory = None
+
+
+def _init_worker(path):
+    global _worker_inventory
+    _worker_inventory, _ = load_prizes(path)
+
+
+def _run_chunk(args):
+    events, draws, mode, seed = args
+    return simulate_events(_worker_inventory, events, draws, mode, seed)
+
+
+# ================= 并行调度 =================
+def run_simulation(path, events, draws=None, workers=None, mode="weighted", seed=None, chunk=None):
+    """把events场活动切块分发到进程池，汇总统计。每块有独立的派生种子，结果可复现"""
+    inventory, error_lines = load_prizes_parallel(path, workers)
+    if draws is None:
+        draws = inventory.total
+    workers = workers or os.cpu_count() or 1
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    # 块数取进程数的若干倍，减少尾部等待
+    chunk = chunk or max(1, math.ceil(events / (workers * 8)))
+    tasks = []
+    for i, start in enumerate(range(0, events, chunk)):
+        tasks.append((min(chunk, events - start), draws, mode, f"{seed}:{i}"))
+
+    total = None
+    if workers == 1:
+        global _worker_inventory
+        _worker_inventory = inventory
+        for task in tasks:
+            total = merge_results(total, _run_chunk(task))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path,)) as pool:
+            for part in pool.map(_run_chunk, tasks):
+                total = merge_results(total, part)
+
+    return summarize(inventory, total or simulate_events(inventory, 0, draws), draws, seed), error_lines
+
+
+def summarize(inventory, result, draws, seed):
+    events = result["events"]
+    prizes = []
+    for i, (name, quantity) in enumerate(inventory.items()):
+        count = result["exhausted"][i]
+        entry = {"name": name, "quantity": quantity, "exhausted_rate": count / events if events else 0.0}
+        if count:
+            mean = result["at_sum"][i] / count
+            var = max(result["at_sq_sum"][i] / count - mean * mean, 0.0)
+            entry.update(mean_exhausted_at=mean, std_exhausted_at=math.sqrt(var),
+                         min_exhausted_at=result["at_min"][i], max_exhausted_at=result["at_max"][i])
+        prizes.append(entry)
+    return {
+        "seed": seed,
+        "events": events,
+        "draws_per_event": draws,
+        "units": inventory.total,
+        "empty_event_rate": result["empty_events"] / events if events else 0.0,
+        "mean_empty_draws": result["empty_draws"] / events if events else 0.0,
+        "mean_first_empty_draw": (result["first_empty_sum"] / result["empty_events"]
+                                  if result["empty_events"] else None),
+        "prizes": prizes,
+    }
+
+
+def print_report(summary, top=30):
+    print(f"模拟{summary['events']}场活动，每场{summary['draws_per_event']}次抽奖，"
+          f"奖品共{summary['units']}件，种子{summary['seed']}")
+    print(f"出现空抽的场次比例：{summary['empty_event_rate']:.2%}，"
+          f"平均每场空抽{summary['mean_empty_draws']:.2f}次")
+    print(f"{'奖品':<20}{'数量':>8}{'抽完比例':>10}{'平均抽完于':>12}{'标准差':>10}{'最早':>8}{'最晚':>8}")
+    rows = sorted(summary["prizes"], key=lambda p: p.get("mean_exhausted_at", math.inf))
+    for p in rows[:top]:
+        if "mean_exhausted_at" in p:
+            print(f"{p['name']:<20}{p['quantity']:>8}{p['exhausted_rate']:>10.2%}{p['mean_exhausted_at']:>12.1f}"
+                  f"{p['std_exhausted_at']:>10.1f}{p['min_exhausted_at']:>8}{p['max_exhausted_at']:>8}")
+        else:
+            print(f"{p['name']:<20}{p['quantity']:>8}{p['exhausted_rate']:>10.2%}{'-':>12}{'-':>10}{'-':>8}{'-':>8}")
+    if len(rows) > top:
+        print(f"……共{len(rows)}种奖品，使用--json查看全部")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽奖活动蒙特卡洛模拟")
+    parser.add_argument("catalogue", nargs="?", default="prizes.csv", help="奖品表CSV")
+    parser.add_argument("-n", "--events", type=int, default=10000, help="模拟的活动场次")
+    parser.add_argument("-d", "--draws", type=int, help="每场抽奖次数，默认等于奖品总件数")
+    parser.add_argument("-j", "--workers", type=int, help="进程数，默认CPU核数")
+    parser.add_argument("--mode", choices=DrawEngine.MODES, default="weighted")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="输出JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary, error_lines = run_simulation(args.catalogue, args.events, args.draws,
+                                          args.workers, args.mode, args.seed)
+    summary["elapsed"] = time.perf_counter() - start
+    if error_lines:
+        print(f"奖品表有{len(error_lines)}处错误，已跳过对应行", file=sys.stderr)
+    if args.json:
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_report(summary)
+        print(f"用时{summary['elapsed']:.2f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""奖品表二进制快照：把解析好的库存按列写成一个文件，启动时mmap直接使用，免去逐行解析CSV
+
+文件布局（小端，各段8字节对齐）：
+    头部  HEADER（见下）
+    offsets     int64[count + 1]   名称在names段中的起止偏移
+    quantities  int64[count]
+    tree        int64[count + 1]   树状数组
+    active      int64[active]      有库存奖品下标
+    active_pos  int64[count]
+    names       UTF-8字节串
+    errors      JSON：CSV解析错误的总数与样本
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from draw_engine import BATCH_SIZE, LoadErrors, PrizeInventory, decode_catalogue, iter_prize_batches
+from draw_ingest import load_prizes_parallel
+
+MAGIC = b"DRAWSNP1"
+VERSION = 1
+# magic, version, flags, count, active, total, names_len, errors_len, csv_mtime_ns, csv_size, csv_sha1
+HEADER = struct.Struct("<8sIIqqqqqqq20s4x")
+
+
+def snapshot_path_for(csv_path):
+    return csv_path + ".snap"
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+# ================= 写入 =================
+def write_snapshot(path, inventory, errors, source_stat, source_sha1):
+    """写入快照：先写临时文件再原子替换"""
+    columns = inventory.columns()
+    error_blob = json.dumps({"count": len(errors), "samples": list(errors)}, ensure_ascii=False).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, 0, len(inventory), len(columns["active"]), inventory.total,
+                         len(columns["names"]), len(error_blob),
+                         source_stat.st_mtime_ns, source_stat.st_size, source_sha1)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for key in ("offsets", "quantities", "tree", "active", "active_pos"):
+            f.write(memoryview(columns[key]).cast("B"))
+        f.write(columns["names"])
+        f.write(error_blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _touch_header(path, source_stat):
+    """CSV内容未变只是修改时间变了：原地更新头部记录的mtime和大小"""
+    with open(path, "r+b") as f:
+        fields = list(HEADER.unpack(f.read(HEADER.size)))
+        fields[8] = source_stat.st_mtime_ns
+        fields[9] = source_stat.st_size
+        f.seek(0)
+        f.write(HEADER.pack(*fields))
+
+
+# ================= 读取 =================
+def read_header(path):
+    """读取快照头部，文件不存在或格式不符时返回None"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < HEADER.size:
+        return None
+    fields = HEADER.unpack(raw)
+    if fields[0] != MAGIC or fields[1] != VERSION:
+        return None
+    return fields
+
+
+def snapshot_size(fields):
+    """按头部记录的各段长度算出快照文件应有的大小"""
+    (_, _, _, count, active, _, names_len, errors_len, _, _, _) = fields
+    return HEADER.size + 8 * (4 * count + 2 + active) + names_len + errors_len
+
+
+def open_snapshot(path):
+    """mmap打开快照，返回(库存, LoadErrors)；文件长度与头部不符（写到一半、被截断）时抛出ValueError。
+
+    以写时复制方式映射：数量、树等列直接是映射内存上的memoryview，抽奖时的修改
+    只落在进程私有页上，不会写回快照文件。
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(mm) < HEADER.size or len(mm) != snapshot_size(HEADER.unpack_from(mm, 0)):
+        raise ValueError(f"{path}已损坏")
+    (_, _, _, count, active, total, names_len, errors_len, _, _, _) = HEADER.unpack_from(mm, 0)
+    view = memoryview(mm)
+    pos = HEADER.size
+
+    def take_int64(n):
+        nonlocal pos
+        column = view[pos:pos + 8 * n].cast("q")
+        pos += 8 * n
+        return column
+
+    offsets = take_int64(count + 1)
+    quantities = take_int64(count)
+    tree = take_int64(count + 1)
+    active_ids = take_int64(active)
+    active_pos = take_int64(count)
+    names = view[pos:pos + names_len]
+    pos += names_len
+    error_info = json.loads(str(view[pos:pos + errors_len], "utf-8"))
+
+    errors = LoadErrors(len(error_info["samples"]))
+    errors.count = error_info["count"]
+    errors.samples = error_info["samples"]
+    inventory = PrizeInventory.from_buffers(names, offsets, quantities, tree, active_ids, active_pos, total)
+    return inventory, errors
+
+
+def open_cached_catalogue(csv_path="prizes.csv", snapshot_path=None):
+    """快照仍然有效时映射快照并返回(库存, LoadErrors)，需要重建时返回None。
+
+    CSV的mtime和大小与快照记录一致即视为有效；不一致时再比较内容哈希，
+    哈希相同只更新头部。快照只是缓存，损坏（长度不符、内容解不开）时也返回None，重新解析CSV。
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    st = os.stat(csv_path)
+    header = read_header(snapshot_path)
+    if header is None or os.path.getsize(snapshot_path) != snapshot_size(header):
+        return None
+    if header[8] != st.st_mtime_ns or header[9] != st.st_size:
+        if header[10] != file_sha1(csv_path):
+            return None
+        _touch_header(snapshot_path, st)
+    try:
+        return open_snapshot(snapshot_path)
+    except (ValueError, KeyError, TypeError):
+        # JSON、UTF-8解码错误都是ValueError的子类
+        return None
+
+
+def catalogue_sha1(csv_path="prizes.csv", snapshot_path=None):
+    """CSV内容的SHA-1：快照的mtime和大小与CSV一致时直接取头部记录的值，否则读整个文件计算"""
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    st = os.stat(csv_path)
+    header = read_header(snapshot_path)
+    if header is not None and header[8] == st.st_mtime_ns and header[9] == st.st_size:
+        return header[10]
+    return file_sha1(csv_path)
+
+
+def save_snapshot(snapshot_path, inventory, errors, st, csv_path):
+    """解析结果写成快照；st为开始解析前CSV的stat，期间文件被改过或写入失败时返回False"""
+    now = os.stat(csv_path)
+    if (now.st_mtime_ns, now.st_size) != (st.st_mtime_ns, st.st_size):
+        # 解析期间CSV又被修改，这次的结果不能代表当前文件
+        return False
+    try:
+        write_snapshot(snapshot_path, inventory, errors, st, file_sha1(csv_path))
+    except OSError:
+        # 快照只是加速手段：目录只读或旧快照仍被映射（Windows）时放弃写入
+        return False
+    return True
+
+
+def load_catalogue(csv_path="prizes.csv", snapshot_path=None):
+    """优先使用快照加载奖品表，快照失效时重新解析CSV并重建快照，返回(库存, LoadErrors)"""
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    cached = open_cached_catalogue(csv_path, snapshot_path)
+    if cached is not None:
+        return cached
+
+    st = os.stat(csv_path)
+    inventory, errors = load_prizes_parallel(csv_path)
+    if not save_snapshot(snapshot_path, inventory, errors, st, csv_path):
+        return inventory, errors
+    return open_snapshot(snapshot_path)
+
+
+def iter_catalogue_batches(csv_path="prizes.csv", errors=None, snapshot_path=None, batch_size=BATCH_SIZE):
+    """流式解析CSV，逐批产出(rows, 已读字节数, 文件总字节数)，全部读完后顺带重建快照。
+
+    供后台线程边读边交给界面；快照按原始数量写入，不受加载期间抽奖的影响。
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    if errors is None:
+        errors = LoadErrors()
+    st = os.stat(csv_path)
+    inventory = PrizeInventory()
+    with open(csv_path, "rb") as raw, decode_catalogue(raw) as f:
+        for batch in iter_prize_batches(f, batch_size, errors):
+            inventory.extend(batch)
+            # 按原始文件（压缩文件即压缩后）已读的字节数计算进度
+            yield batch, raw.tell(), st.st_size
+    save_snapshot(snapshot_path, inventory, errors, st, csv_path)
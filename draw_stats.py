@@ -0,0 +1,99 @@
+"""实时统计：各奖品已抽出件数、滑动窗口内的抽取速度、距上次抽中的时间
+
+每次抽奖时增量更新，查询不需要扫描任何日志。统计从挂到DrawEngine.stats上开始累计
+（即本次启动以来），不回放之前的中奖记录。
+"""
+import heapq
+import time
+from collections import Counter, deque
+
+RATE_WINDOW = 60.0  # 抽取速度按最近这么多秒计算，换算成每分钟件数
+
+
+class PrizeStats:
+    """按奖品下标维护的累计统计，挂到DrawEngine.stats上后每次抽奖调用record。
+
+    滑动窗口用一个(时间戳, 下标, 件数)队列加窗口内计数实现：每条事件只进出队列各一次，
+    摊还下来每次更新和查询都是O(1)。批量抽奖按奖品合并成一条事件。
+    """
+    def __init__(self, window=RATE_WINDOW, clock=time.time):
+        self.window = window
+        self.clock = clock
+        self.inventory = None  # 最近一次记录时的库存，用来取名称
+        self.awarded = Counter()  # 下标 -> 累计件数
+        self.last_win = {}  # 下标 -> 最近一次抽中的时间戳
+        self.total = 0
+        self.last_ts = None
+        self._events = deque()
+        self._in_window = Counter()  # 下标 -> 窗口内件数
+        self._window_total = 0
+
+    def record(self, inventory, indices, ts=None):
+        """DrawEngine的记录接口：记一次抽奖（或一次批量抽奖）抽走的若干件"""
+        if not indices:
+            return
+        ts = self.clock() if ts is None else ts
+        self.inventory = inventory
+        counts = Counter(indices) if len(indices) > 1 else {indices[0]: 1}
+        for index, count in counts.items():
+            self.awarded[index] += count
+            self.last_win[index] = ts
+            self._in_window[index] += count
+            self._events.append((ts, index, count))
+        self.total += len(indices)
+        self._window_total += len(indices)
+        self.last_ts = ts
+        self._expire(ts)
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        events = self._events
+        while events and events[0][0] <= cutoff:
+            _, index, count = events.popleft()
+            self._window_total -= count
+            left = self._in_window[index] - count
+            if left:
+                self._in_window[index] = left
+            else:
+                del self._in_window[index]
+
+    # ================= 查询 =================
+    def count(self, index):
+        """该奖品累计抽出的件数"""
+        return self.awarded.get(index, 0)
+
+    def rate(self, index=None, now=None):
+        """最近window秒内的抽取速度（件/分钟）；index为None时为全部奖品合计"""
+        self._expire(self.clock() if now is None else now)
+        in_window = self._window_total if index is None else self._in_window.get(index, 0)
+        return in_window * 60.0 / self.window
+
+    def since_last(self, index=None, now=None):
+        """距上次抽中该奖品（index为None时为任一奖品）的秒数，还没抽中过时为None"""
+        ts = self.last_ts if index is None else self.last_win.get(index)
+        if ts is None:
+            return None
+        return max(0.0, (self.clock() if now is None else now) - ts)
+
+    def summary(self, index, now=None):
+        """(名称, 累计件数, 件/分钟, 距上次抽中秒数)"""
+        now = self.clock() if now is None else now
+        return (self.inventory.name(index), self.count(index),
+                self.rate(index, now), self.since_last(index, now))
+
+    def top(self, n=10, now=None):
+        """累计件数最多的n种奖品的summary，只在抽中过的奖品里挑"""
+        now = self.clock() if now is None else now
+        return [self.summary(index, now) for index in heapq.nlargest(n, self.awarded, key=self.awarded.__getitem__)]
+
+
+def format_elapsed(seconds):
+    """把秒数写成"45秒"、"3分05秒"、"2小时07分"，None写成"-"。"""
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}秒"
+    if seconds < 3600:
+        return f"{seconds // 60}分{seconds % 60:02d}秒"
+    return f"{seconds // 3600}小时{seconds % 3600 // 60:02d}分"
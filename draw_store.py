@@ -0,0 +1,155 @@
+"""SQLite存储：奖品库存与中奖记录放在同一个数据库里（WAL模式），可替代CSV加内存的方式
+
+    prizes(id, name, quantity)       id即库存中的奖品下标，quantity为剩余数量
+    draws(seq, ts, prize_id)         每件抽出的奖品一行，seq自增
+
+第一次打开时从奖品表导入，之后以数据库为准。挂到DrawEngine.journal上后，
+每次抽奖（或一次批量抽奖）在一个事务里扣减数量并写入中奖记录。
+"""
+import sqlite3
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from draw_engine import BATCH_SIZE, PrizeInventory
+from draw_snapshot import load_catalogue
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prizes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS draws (
+    seq INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    prize_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS draws_ts ON draws (ts);
+CREATE INDEX IF NOT EXISTS draws_prize ON draws (prize_id, ts);
+CREATE INDEX IF NOT EXISTS prizes_name ON prizes (name);
+"""
+
+# 语句保持不变，sqlite3模块按文本缓存编译结果，相当于预编译语句
+SQL_TAKE = "UPDATE prizes SET quantity = quantity - ? WHERE id = ?"
+SQL_RECORD = "INSERT INTO draws (ts, prize_id) VALUES (?, ?)"
+SQL_RANGE = ("SELECT d.seq, d.ts, p.name FROM draws d JOIN prizes p ON p.id = d.prize_id "
+             "WHERE d.ts >= ? AND d.ts < ? ORDER BY d.ts, d.seq")
+SQL_HISTORY = ("SELECT d.seq, d.ts, p.name FROM draws d JOIN prizes p ON p.id = d.prize_id "
+               "WHERE d.seq <= ? AND d.seq > ? ORDER BY d.seq DESC")
+# 名称前缀换算成区间[prefix, prefix + U+10FFFF)走prizes_name索引，每种奖品的记录再走draws_prize覆盖索引。
+# +d.ts让时间条件不参与选索引：否则没有统计信息时查询计划器会按draws_ts扫描整个时间段
+SQL_SEARCH_FILTER = ("FROM prizes p JOIN draws d ON d.prize_id = p.id "
+                     "WHERE p.name >= ? AND p.name < ? AND +d.ts >= ? AND +d.ts < ?")
+SQL_SEARCH = "SELECT d.seq, d.ts, p.name " + SQL_SEARCH_FILTER + " ORDER BY d.seq DESC LIMIT ?"
+SQL_SEARCH_COUNT = "SELECT count(*) " + SQL_SEARCH_FILTER
+# 不限奖品、只按时间段查找时直接走draws_ts索引：(ts, seq)正是索引顺序，取最新的limit条不需要排序
+SQL_SEARCH_TIME = ("SELECT d.seq, d.ts, p.name FROM draws d JOIN prizes p ON p.id = d.prize_id "
+                   "WHERE d.ts >= ? AND d.ts < ? ORDER BY d.ts DESC, d.seq DESC LIMIT ?")
+SQL_SEARCH_TIME_COUNT = "SELECT count(*) FROM draws WHERE ts >= ? AND ts < ?"
+SEARCH_LIMIT = 1000
+
+
+class SqliteStore:
+    def __init__(self, path):
+        self.path = path
+        # 事务由本类显式控制
+        self.conn = sqlite3.connect(path, isolation_level=None, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL下NORMAL只在检查点时fsync：进程崩溃不丢已提交事务，断电最多丢最近的几个
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def has_catalogue(self):
+        return self.conn.execute("SELECT EXISTS (SELECT 1 FROM prizes)").fetchone()[0] == 1
+
+    def import_catalogue(self, inventory):
+        """把加载好的库存整体写入（只在数据库还没有奖品时调用）"""
+        with self._transaction():
+            self.conn.executemany("INSERT INTO prizes (id, name, quantity) VALUES (?, ?, ?)",
+                                  ((i, name, quantity) for i, (name, quantity) in enumerate(inventory.items())))
+
+    def load_inventory(self, batch_size=BATCH_SIZE):
+        """按id顺序分批读出库存"""
+        inventory = PrizeInventory()
+        cursor = self.conn.execute("SELECT name, quantity FROM prizes ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            inventory.extend(rows)
+        return inventory
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def record(self, inventory, indices):
+        """一次抽奖（或一次批量抽奖）抽走的若干件：扣减数量并写中奖记录，在同一个事务里提交"""
+        if not indices:
+            return
+        now = time.time()
+        with self._transaction():
+            if len(indices) == 1:
+                self.conn.execute(SQL_TAKE, (1, indices[0]))
+                self.conn.execute(SQL_RECORD, (now, indices[0]))
+            else:
+                self.conn.executemany(SQL_TAKE, ((count, index) for index, count in Counter(indices).items()))
+                self.conn.executemany(SQL_RECORD, ((now, index) for index in indices))
+
+    def __len__(self):
+        """中奖记录条数。seq连续自增，取最大值即可，不必count(*)全表扫描"""
+        return self.conn.execute("SELECT coalesce(max(seq), 0) FROM draws").fetchone()[0]
+
+    def read_recent(self, offset, limit):
+        """从最新一条往前数，跳过offset条后的limit条，新的在前，返回[(seq, ts, name), ...]。
+
+        按seq区间定位而不用OFFSET，翻到很靠后的页也只读这一页。
+        """
+        top = len(self) - offset
+        return self.conn.execute(SQL_HISTORY, (top, top - limit)).fetchall()
+
+    def iter_range(self, start_ts=None, end_ts=None, batch_size=BATCH_SIZE):
+        """按时间段[start_ts, end_ts)顺序产出(seq, ts, name)，None表示不限。
+
+        按(ts, seq)排序正好是draws_ts索引的顺序，不需要额外排序，游标分批取，内存占用固定。
+        """
+        start_ts = float("-inf") if start_ts is None else start_ts
+        end_ts = float("inf") if end_ts is None else end_ts
+        cursor = self.conn.execute(SQL_RANGE, (start_ts, end_ts))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def search(self, prefix, start_ts=None, end_ts=None, limit=SEARCH_LIMIT):
+        """按奖品名称前缀和时间段[start_ts, end_ts)查找，返回(匹配总数, 最新的limit条[(seq, ts, name), ...])，
+        与HistoryLog.search相同"""
+        span = (float("-inf") if start_ts is None else start_ts,
+                float("inf") if end_ts is None else end_ts)
+        if not prefix:
+            total = self.conn.execute(SQL_SEARCH_TIME_COUNT, span).fetchone()[0]
+            return total, self.conn.execute(SQL_SEARCH_TIME, span + (limit,)).fetchall()
+        params = (prefix, prefix + "\U0010ffff") + span
+        total = self.conn.execute(SQL_SEARCH_COUNT, params).fetchone()[0]
+        return total, self.conn.execute(SQL_SEARCH, params + (limit,)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(path, catalogue):
+    """打开数据库，返回(SqliteStore, 库存, LoadErrors或None)。数据库为空时先从奖品表导入"""
+    store = SqliteStore(path)
+    if store.has_catalogue():
+        return store, store.load_inventory(), None
+    inventory, errors = load_catalogue(catalogue)
+    store.import_catalogue(inventory)
+    return store, inventory, errors